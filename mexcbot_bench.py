@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mexcbot_bench.py
+Micro-benchmarks for the hot-path components.
+  python mexcbot_bench.py netvol [--n 200000] [--rate 5000]
+  python mexcbot_bench.py capture --out frames.jsonl [--seconds 60]
+  python mexcbot_bench.py decode [--corpus frames.jsonl]
+  python mexcbot_bench.py book [--n 100000]
+  python mexcbot_bench.py startup [--repeat 5]
+  python mexcbot_bench.py exec [--backends selenium cdp] [--rounds 50] [--fill-ms 50]
+"""
+from __future__ import annotations
+import argparse, json, os, random, time
+from collections import deque
+
+import mexcbot_core as core
+import mexcbot_decode as dec
+
+
+def _synthetic_trades(n: int, rate: float, seed: int = 1):
+    """(ts, price, qty, is_buy) at roughly `rate` prints/sec, i.e. a burst tape."""
+    rnd = random.Random(seed)
+    ts = 1_700_000_000.0; px = 3.5
+    out = []
+    for _ in range(n):
+        ts += rnd.expovariate(rate)
+        px += rnd.choice((-0.0001, 0.0, 0.0001))
+        out.append((ts, px, round(rnd.uniform(1, 500), 1), rnd.random() < 0.5))
+    return out
+
+
+class NetVolumeWindow:
+    """The deque + sum() window StrategyMonitor used before RollingNetVolume; the baseline here."""
+    def __init__(self, window_sec: float):
+        self.window = float(window_sec)
+        self._win = deque()  # (ts, signed_qty)
+
+    def add(self, now: float, qty: float, is_buy: bool):
+        signed = qty if is_buy else -qty
+        self._win.append((now, signed))
+        cutoff = now - self.window
+        w = self._win
+        while w and w[0][0] < cutoff:
+            w.popleft()
+
+    def sum(self) -> float:
+        return sum(v for _, v in self._win)
+
+
+def bench_netvol(n: int, rate: float) -> None:
+    trades = _synthetic_trades(n, rate)
+    window = core.TIGHT_GATE_WINDOW_SEC
+
+    # old deque implementation: add() + sum() per trade, as on_trade did
+    legacy = NetVolumeWindow(window)
+    t0 = time.perf_counter()
+    for ts, px, q, b in trades:
+        legacy.add(ts, q, b)
+        legacy_net = legacy.sum()
+    t_legacy = time.perf_counter() - t0
+
+    for windows in ((window,), (window, core.BURST_WINDOW_SEC)):
+        roll = core.RollingNetVolume(windows)
+        t0 = time.perf_counter()
+        for ts, px, q, b in trades:
+            roll.add(ts, q, b, px)
+            net = roll.net()
+        t_roll = time.perf_counter() - t0
+        assert abs(net - legacy_net) < 1e-6, (net, legacy_net)
+        print(f"RollingNetVolume windows={windows}: {t_roll / n * 1e9:8.0f} ns/trade")
+    print(f"NetVolumeWindow  (deque+sum)     : {t_legacy / n * 1e9:8.0f} ns/trade  "
+          f"({roll.count():d} prints in window at end)")
+
+
+def _synthetic_frames(n: int, seed: int = 3):
+    """Combined-stream frames in the live mix: @trade + @aggTrade + @depth5@100ms."""
+    rnd = random.Random(seed); sym = core.SYMBOL
+    out = []; tid = 1_000_000; aid = 50_000; px = 3.5; t = 1_700_000_000_000
+    for i in range(n):
+        t += rnd.randint(0, 20)
+        r = i % 5
+        if r == 4:
+            lv = lambda s: [[f"{px + s * k * 0.0001:.4f}", f"{rnd.uniform(10, 5000):.1f}"] for k in range(1, 6)]
+            data = {"lastUpdateId": tid, "bids": lv(-1), "asks": lv(1)}
+            out.append(json.dumps({"stream": f"{sym}@depth5@100ms", "data": data}))
+        elif r % 2 == 0:
+            tid += 1
+            data = {"e": "trade", "E": t, "s": sym.upper(), "t": tid, "p": f"{px:.4f}", "q": f"{rnd.uniform(1, 300):.1f}",
+                    "T": t, "m": rnd.random() < 0.5, "M": True}
+            out.append(json.dumps({"stream": f"{sym}@trade", "data": data}))
+        else:
+            aid += 1
+            data = {"e": "aggTrade", "E": t, "s": sym.upper(), "a": aid, "p": f"{px:.4f}", "q": f"{rnd.uniform(1, 300):.1f}",
+                    "f": tid + 1, "l": tid + 1, "T": t, "m": rnd.random() < 0.5, "M": True}
+            out.append(json.dumps({"stream": f"{sym}@aggTrade", "data": data}))
+    return out
+
+
+def _legacy_decode(message: str):
+    """The pre-decoder WSClient._on_message parsing path, minus the callbacks."""
+    obj = json.loads(message)
+    s = obj.get("stream", ""); d = obj.get("data", {})
+    if s.endswith("@trade") or s.endswith("@aggTrade"):
+        price = float(d.get("p") or d.get("price"))
+        qty = float(d.get("q") or d.get("quantity") or 0.0)
+        return price, qty, bool(d.get("m") is False)
+    elif s.endswith("@depth5@100ms"):
+        bids = d.get("b") or d.get("bids") or []; asks = d.get("a") or d.get("asks") or []
+        if bids and asks: return float(bids[0][0]), float(asks[0][0])
+    return None
+
+
+def bench_decode(corpus: str, n: int, repeat: int) -> None:
+    if corpus:
+        with open(corpus, "rb") as f:
+            frames_b = [ln.rstrip(b"\n") for ln in f if ln.strip()]
+        print(f"corpus {corpus}: {len(frames_b)} frames")
+    else:
+        frames_b = [x.encode() for x in _synthetic_frames(n)]
+        print(f"synthetic corpus: {len(frames_b)} frames")
+    frames_s = [x.decode() for x in frames_b]  # websocket-client hands text frames over as str
+    streams = sorted({json.loads(x)["stream"] for x in frames_s})
+    cases = [("legacy json+endswith", lambda: _legacy_decode, frames_s)]
+    for backend in ("json", "orjson"):
+        try: dec.loads_for(backend)
+        except RuntimeError: print(f"{backend:>22}: not installed"); continue
+        # dedup off: the corpus replays the same ids on every repeat
+        cases.append((f"StreamDecoder[{backend}]", lambda b=backend: dec.StreamDecoder(streams, b, dedup=False).decode, frames_s))
+    for name, make, frames in cases:
+        best = float("inf")
+        for _ in range(repeat):
+            fn = make()
+            t0 = time.perf_counter()
+            for fr in frames: fn(fr)
+            best = min(best, time.perf_counter() - t0)
+        print(f"{name:>22}: {len(frames) / best:12,.0f} msgs/s  ({best / len(frames) * 1e9:6.0f} ns/msg)")
+
+
+def bench_book(n: int, repeat: int = 3) -> None:
+    """Per depth update: top-of-book only (on_depth) vs the top-N book + features (on_book)."""
+    from mexcbot_book import TopBook
+    frames = [f for f in _synthetic_frames(n * 5) if "@depth" in f][:n]
+    levels = [(d["bids"], d["asks"], d["lastUpdateId"]) for d in (json.loads(f)["data"] for f in frames)]
+    decoder = dec.StreamDecoder([f"{core.SYMBOL}@depth5@100ms"], dedup=False)
+    events = []
+    for f in frames:  # the decoder reuses its event object; keep one per frame
+        ev = decoder.decode(f); cp = dec.DepthEvent()
+        for k in dec.DepthEvent.__slots__: setattr(cp, k, getattr(ev, k))
+        events.append(cp)
+    def run(name, fn):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t0)
+        print(f"{name:>28}: {best / len(frames) * 1e9:7.0f} ns/update")
+    def snapshots():
+        b = TopBook()
+        for bids, asks, uid in levels: b.snapshot(bids, asks, uid)
+    def monitor(book: bool, cfg=None):
+        m = core.StrategyMonitor(core.DryRunTrader(), cfg, log=lambda s: None)
+        if book:
+            for ev in events: m.on_book(ev)
+        else:
+            for ev in events: m.on_depth(ev.bid, ev.ask)
+    run("TopBook.snapshot", snapshots)
+    run("StrategyMonitor.on_depth", lambda: monitor(False))
+    gates = core.StrategyConfig(min_imbalance=0.2, max_depth_spread_usd=0.001)
+    run("on_book (gates off)", lambda: monitor(True))
+    run("on_book (gates on)", lambda: monitor(True, gates))
+    m = core.StrategyMonitor(core.DryRunTrader(), gates)
+    m.on_book(events[-1])
+    t0 = time.perf_counter()
+    for _ in range(n): m._book_ok(1)
+    print(f"{'gate read (_book_ok)':>28}: {(time.perf_counter() - t0) / n * 1e9:7.0f} ns/trade")
+
+
+HEAVY_MODULES = ("selenium", "websocket", "orjson", "http.server", "numpy", "mexcbot_executor", "mexcbot_cdp")
+
+
+def _worker_ready() -> int:
+    import mexcbot_replay, mexcbot_tickstore  # what a sweep worker needs before its first run
+    return os.getpid()
+
+
+def bench_startup(repeat: int) -> None:
+    """Fresh-interpreter import time per entry module (best of `repeat`) and pool worker start-up."""
+    import multiprocessing as mp, subprocess, sys
+    from concurrent.futures import ProcessPoolExecutor
+    probe = f"import sys; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    for name, code in (("python -c pass", "pass"), ("import mexcbot_core", "import mexcbot_core"),
+                       ("import mexcbot_replay", "import mexcbot_replay"), ("import mexcbot_sweep", "import mexcbot_sweep"),
+                       ("mexcbot_core -h", "import mexcbot_core, contextlib, io\nwith contextlib.redirect_stdout(io.StringIO()):\n"
+                                          "    try: mexcbot_core.main(['-h'])\n    except SystemExit: pass")):
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True)
+            best = min(best, time.perf_counter() - t0)
+        heavy = subprocess.run([sys.executable, "-c", f"{code}\n{probe}"], capture_output=True, text=True).stdout.strip()
+        print(f"{name:>22}: {best * 1e3:7.1f} ms  loaded: {heavy or '-'}")
+    for method in ("fork", "spawn"):
+        if method not in mp.get_all_start_methods(): continue
+        best = float("inf")
+        for _ in range(repeat):
+            with ProcessPoolExecutor(1, mp_context=mp.get_context(method)) as pool:
+                t0 = time.perf_counter(); pool.submit(_worker_ready).result()
+                best = min(best, time.perf_counter() - t0)
+        print(f"{'worker (' + method + ')':>22}: {best * 1e3:7.1f} ms to first result")
+    import mexcbot_sweep
+    ctx = mexcbot_sweep.pool_context()  # one forkserver per process: must be the first forkserver user here
+    with ProcessPoolExecutor(1, mp_context=ctx) as pool: pool.submit(_worker_ready).result()  # server up
+    best = float("inf")
+    for _ in range(repeat):
+        with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+            t0 = time.perf_counter(); pool.submit(_worker_ready).result()
+            best = min(best, time.perf_counter() - t0)
+    print(f"{'worker (sweep pool)':>22}: {best * 1e3:7.1f} ms to first result (server warm)")
+
+
+def capture(out: str, seconds: float) -> None:
+    """Save raw frames from the live subscription (one per line) for `decode --corpus`."""
+    import websocket  # websocket-client
+    ws = websocket.create_connection(core.BINANCE_WS_URL, timeout=10)
+    n = 0; end = time.time() + seconds
+    with open(out, "w", encoding="utf-8") as f:
+        while time.time() < end:
+            f.write(ws.recv() + "\n"); n += 1
+    ws.close()
+    print(f"captured {n} frames to {out}")
+
+
+def bench_exec(backends, rounds: int, fill_ms: float, qty: float, port: int, chrome_bin: str = None) -> None:
+    """
+    A/B of executor backends against the fake MEXC page (mexcbot_sim) on a headless
+    Chrome: per action, call -> confirmed fill. The page fills after fill_ms, so
+    anything above it is executor overhead.
+    """
+    import mexcbot_sim as sim
+    from mexcbot_latency import LatencyHistogram
+    page = sim.FakeMexcPage().start()
+    chrome = sim.launch_chrome(page.url(fill_ms, toast_ms=1000), port, chrome_bin)
+    try:
+        for backend in backends:
+            trader = core.make_ui_trader(backend, f"127.0.0.1:{port}")
+            h = {a: LatencyHistogram() for a in ("qty", "long", "short", "settle")}
+            fails = 0
+            for i in range(rounds):
+                for act, fn, arg in (("qty", trader.prepare_next_entry_qty, qty + i % 2),
+                                     ("long" if i % 2 == 0 else "short",
+                                      trader.fast_click_long if i % 2 == 0 else trader.fast_click_short, None),
+                                     ("settle", trader.fast_click_settle, None)):
+                    t0 = time.monotonic_ns()
+                    ok = fn(arg) if arg is not None else fn()
+                    t1 = trader.last_fill_ns() if act != "qty" else time.monotonic_ns()
+                    if not ok: fails += 1; continue
+                    h[act].record(max(t1, t0) - t0)
+            print(f"--- {backend} ({rounds} rounds, fill after {fill_ms:.0f} ms, failures={fails})")
+            for act, hh in h.items():
+                if not hh.n: continue
+                print(f"{act:>7}: p50={hh.percentile(50) / 1e6:8.1f} ms  p99={hh.percentile(99) / 1e6:8.1f} ms  "
+                      f"max={hh.max / 1e6:8.1f} ms  n={hh.n}")
+            if hasattr(trader, "close"): trader.close()
+    finally:
+        chrome.terminate(); page.close()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="MEXCbot micro-benchmarks")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("netvol", help="RollingNetVolume vs NetVolumeWindow")
+    p.add_argument("--n", type=int, default=200_000)
+    p.add_argument("--rate", type=float, default=5000.0, help="prints per second")
+    p = sub.add_parser("decode", help="frame decoding throughput per backend")
+    p.add_argument("--corpus", default="", help="raw frames, one per line (see capture)")
+    p.add_argument("--n", type=int, default=200_000, help="synthetic frames when no corpus")
+    p.add_argument("--repeat", type=int, default=3)
+    p = sub.add_parser("book", help="top-N book maintenance and gate cost per depth update")
+    p.add_argument("--n", type=int, default=100_000)
+    p = sub.add_parser("startup", help="import time per mode and process-pool worker start-up")
+    p.add_argument("--repeat", type=int, default=5)
+    p = sub.add_parser("capture", help="record raw frames from Binance")
+    p.add_argument("--out", required=True)
+    p.add_argument("--seconds", type=float, default=60.0)
+    p = sub.add_parser("exec", help="executor backends A/B on the fake MEXC page (needs Chrome)")
+    p.add_argument("--backends", nargs="+", default=["selenium", "cdp"], choices=("selenium", "cdp"))
+    p.add_argument("--rounds", type=int, default=50)
+    p.add_argument("--fill-ms", type=float, default=50.0)
+    p.add_argument("--qty", type=float, default=100.0)
+    p.add_argument("--port", type=int, default=9333)
+    p.add_argument("--chrome-bin")
+    args = ap.parse_args()
+    if args.cmd == "netvol":
+        bench_netvol(args.n, args.rate)
+    elif args.cmd == "decode":
+        bench_decode(args.corpus, args.n, args.repeat)
+    elif args.cmd == "book":
+        bench_book(args.n)
+    elif args.cmd == "startup":
+        bench_startup(args.repeat)
+    elif args.cmd == "capture":
+        capture(args.out, args.seconds)
+    elif args.cmd == "exec":
+        bench_exec(args.backends, args.rounds, args.fill_ms, args.qty, args.port, args.chrome_bin)
+
+
+if __name__ == "__main__":
+    main()
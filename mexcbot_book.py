@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mexcbot_book.py
+Top-N order book kept in place from depth frames, plus the gate features
+StrategyMonitor reads on every trade.
+
+- price/qty per side live in fixed array('d') buffers allocated once; each
+  partial-book snapshot (@depth5) overwrites them in place - no lists are built
+  per update. Diff depth is not supported: a top-N book cannot refill levels
+  that move out of range without a deeper REST-seeded book behind it
+- update ids must increase: an older or repeated snapshot is dropped
+- features are recomputed once per accepted update, so gating is attribute reads:
+    imbalance        L1 queue imbalance (bid_qty - ask_qty) / (bid_qty + ask_qty), -1..1
+    depth_imbalance  same over all held levels
+    microprice       (ask * bid_qty + bid * ask_qty) / (bid_qty + ask_qty)
+    depth_spread     qty-weighted avg ask - qty-weighted avg bid over the held levels
+"""
+from __future__ import annotations
+from array import array
+from typing import Sequence
+
+BOOK_LEVELS = 5  # matches the @depth5 subscription
+
+
+def _fill(px: array, qty: array, levels: Sequence, cap: int):
+    """Copy up to cap levels in; returns (count, sum qty, sum price * qty) for the features."""
+    k = 0; sq = sn = 0.0
+    for p, q in levels:
+        if k == cap: break
+        p = float(p); q = float(q)
+        px[k] = p; qty[k] = q; sq += q; sn += p * q; k += 1
+    return k, sq, sn
+
+
+class TopBook:
+    """
+    update(ev) takes a mexcbot_decode.DepthEvent and returns True when the book is
+    usable afterwards. Not thread-safe by itself; StrategyMonitor updates and reads
+    it under its own lock.
+    """
+    def __init__(self, levels: int = BOOK_LEVELS):
+        self.levels = n = int(levels)
+        self.bid_px = array("d", bytes(8 * n)); self.bid_qty = array("d", bytes(8 * n))
+        self.ask_px = array("d", bytes(8 * n)); self.ask_qty = array("d", bytes(8 * n))
+        self.n_bids = 0; self.n_asks = 0
+        self.update_id = 0
+        self.synced = False
+        self.updates = 0       # accepted updates
+        self.out_of_order = 0  # dropped: update id not above the last one
+        self.bid = 0.0; self.ask = 0.0; self.bid_size = 0.0; self.ask_size = 0.0
+        self.mid = 0.0; self.spread = 0.0
+        self.imbalance = 0.0; self.depth_imbalance = 0.0
+        self.microprice = 0.0; self.depth_spread = 0.0
+
+    def reset(self) -> None:
+        """Forget the book (e.g. while the feed is blind); the next snapshot resyncs."""
+        self.n_bids = self.n_asks = 0
+        self.update_id = 0
+        self.synced = False
+
+    def update(self, ev) -> bool:
+        return self.snapshot(ev.bids, ev.asks, ev.update_id)
+
+    def snapshot(self, bids: Sequence, asks: Sequence, update_id: int = 0) -> bool:
+        """Replace the book with the first `levels` of each side. update_id 0 = unknown (no ordering check)."""
+        if update_id and update_id <= self.update_id:
+            self.out_of_order += 1; return False
+        cap = self.levels
+        self.n_bids, sb, nbv = _fill(self.bid_px, self.bid_qty, bids, cap)
+        self.n_asks, sa, nav = _fill(self.ask_px, self.ask_qty, asks, cap)
+        if update_id: self.update_id = update_id
+        return self._features(sb, nbv, sa, nav)
+
+    def _features(self, sb: float, nbv: float, sa: float, nav: float) -> bool:
+        """sb/sa: total qty per side, nbv/nav: sum of price * qty per side, over the held levels."""
+        if not self.n_bids or not self.n_asks:
+            self.synced = False; return False
+        b = self.bid_px[0]; a = self.ask_px[0]; qb = self.bid_qty[0]; qa = self.ask_qty[0]
+        self.bid = b; self.ask = a; self.bid_size = qb; self.ask_size = qa
+        self.mid = (a + b) * 0.5; self.spread = a - b
+        l1 = qb + qa
+        self.imbalance = (qb - qa) / l1 if l1 > 0 else 0.0
+        self.microprice = (a * qb + b * qa) / l1 if l1 > 0 else self.mid
+        self.depth_imbalance = (sb - sa) / (sb + sa) if sb + sa > 0 else 0.0
+        self.depth_spread = nav / sa - nbv / sb if sa > 0 and sb > 0 else self.spread
+        self.updates += 1
+        self.synced = True
+        return True
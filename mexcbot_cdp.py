@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mexcbot_cdp.py
+Executor backend that drives the MEXC tab over the Chrome DevTools Protocol on the
+same debugging port SeleniumBot attaches to, without chromedriver in between.
+
+- one persistent DevTools WebSocket to the page target; a reader thread resolves
+  command replies and pushes events
+- a helper script is injected once (and on every new document): it knows the
+  selectors, reports button centres, sets the qty input, and a MutationObserver
+  pushes every fill toast to Python through Runtime.addBinding (no polling)
+- button coordinates are cached (refreshed by heartbeat()/navigation) and checked
+  with elementFromPoint right before every click, so a toast, modal, scroll or
+  resize since the last refresh can't send the click elsewhere; the check returns
+  the button's current centre when the cached point went stale. The click itself is
+  two fire-and-forget Input.dispatchMouseEvent messages
+- CDPTrader implements BaseTrader, so it can replace MexcTrader
+  (mexcbot_core.EXEC_BACKEND = "cdp") and be A/B benchmarked against it
+  (python mexcbot_bench.py exec)
+"""
+from __future__ import annotations
+import itertools, json, threading, time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.request import urlopen
+
+try:
+    import websocket  # websocket-client
+except Exception:
+    websocket = None
+
+from mexcbot_core import DEBUGGER_ADDR, HEALTH_WAIT_SEC, BaseTrader
+from mexcbot_metrics import log
+
+# toast texts SeleniumBot checks for (mexcbot_executor.COMPLETE_MESSAGE / close_all)
+FILL_MESSAGE = "order filled completely"
+CLOSE_ALL_MESSAGE = "Order Filled"
+CONFIRM_TIMEOUT_SEC = 10.0  # same as SeleniumBot's WebDriverWait
+BINDING = "__mexcbotToast"
+
+SELECTORS = {
+    "tab":       'span[data-testid="contract-trade-order-form-tab-open"]',
+    "qty":       '#mexc_contract_v_open_position div.input-wrapper > div.extend-wrapper > input.ant-input',
+    "long":      'button[data-testid="contract-trade-open-long-btn"]',
+    "short":     'button[data-testid="contract-trade-open-short-btn"]',
+    "close_all": '#mexc-web-futures-exchange-handle-content-right div[class^="CloseAllPosition_closeAllPosition"]',
+    "confirm":   'div.ant-modal-content > div.ant-modal-footer > button.ant-btn.ant-btn-primary',
+    # quick-close buttons are only shown while a position is open (see mexcbot_executor.FAST_CLOSE_SELECTORS)
+    "fast_close_long":  'div[class^="FastClose_short"] button[class^="FastClose_closeBtn"]',
+    "fast_close_short": 'div[class^="FastClose_long"] button[class^="FastClose_closeBtn"]',
+    "toast":     'div.ant-notification-notice-message',
+}
+
+_PAGE_JS = """
+(function(){
+  if (window.__mexcbot) return;
+  var SEL = %(sel)s, BINDING = %(binding)s;
+  function q(s){ return document.querySelector(s); }
+  function center(el){
+    if (!el || el.disabled) return null;
+    var r = el.getBoundingClientRect();
+    if (!r.width || !r.height) return null;
+    var x = r.left + r.width / 2, y = r.top + r.height / 2, hit = document.elementFromPoint(x, y);
+    return (hit && (hit === el || el.contains(hit))) ? [x, y] : null;  // not covered by an overlay
+  }
+  window.__mexcbot = {
+    rects: function(){ var o = {}; for (var k in SEL) if (k !== "toast") o[k] = center(q(SEL[k])); return o; },
+    at: function(k, x, y){  // cached point still on button k? else its current centre (null = not clickable)
+      var el = q(SEL[k]); if (!el || el.disabled) return null;
+      var hit = document.elementFromPoint(x, y);
+      return (hit && (hit === el || el.contains(hit))) ? [x, y] : center(el);
+    },
+    click: function(k){ var el = q(SEL[k]); if (!el) return false; el.click(); return true; },
+    getQty: function(){ var el = q(SEL.qty); return el ? el.value : null; },
+    setQty: function(v){
+      var el = q(SEL.qty); if (!el) return null;
+      // native setter + input event, so React-controlled inputs take the value
+      var set = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, "value").set;
+      el.focus(); set.call(el, v);
+      el.dispatchEvent(new Event("input", {bubbles: true})); el.dispatchEvent(new Event("change", {bubbles: true}));
+      el.blur(); return el.value;
+    },
+    waitFor: function(k, ms){
+      return new Promise(function(res){
+        var t0 = performance.now();
+        (function poll(){
+          var c = center(q(SEL[k]));
+          if (c) return res(c);
+          if (performance.now() - t0 > ms) return res(null);
+          setTimeout(poll, 2);
+        })();
+      });
+    },
+    position: function(){
+      var shown = function(k){ var el = q(SEL[k]); return !!(el && el.getClientRects().length); };
+      return shown("fast_close_long") ? "long" : shown("fast_close_short") ? "short" : "flat";
+    },
+    health: function(){
+      var tab = q(SEL.tab); if (tab) tab.click();
+      return !!(center(q(SEL.long)) && center(q(SEL.short)));
+    }
+  };
+  function scan(){
+    var ns = document.querySelectorAll(SEL.toast);
+    for (var i = 0; i < ns.length; i++) {
+      var n = ns[i], t = (n.textContent || "").trim();
+      if (t && n.__mexcbotSeen !== t) { n.__mexcbotSeen = t; try { window[BINDING](t); } catch (e) {} }
+    }
+  }
+  function arm(){ new MutationObserver(scan).observe(document.documentElement, {childList: true, subtree: true, characterData: true}); }
+  if (document.documentElement) arm(); else document.addEventListener("DOMContentLoaded", arm);
+})();
+""" % {"sel": json.dumps(SELECTORS), "binding": json.dumps(BINDING)}
+
+
+class CDPError(RuntimeError):
+    pass
+
+
+def page_targets(debugger_addr: str = DEBUGGER_ADDR) -> List[Dict[str, Any]]:
+    with urlopen(f"http://{debugger_addr}/json", timeout=5) as r:
+        return [t for t in json.load(r) if t.get("type") == "page" and t.get("webSocketDebuggerUrl")]
+
+
+class CDPSession:
+    """One DevTools connection. call() blocks for the reply; send() does not wait."""
+    def __init__(self, ws_url: str):
+        if websocket is None: raise RuntimeError("websocket-client is not installed")
+        # Chrome rejects DevTools connections that carry an Origin header it does not allow
+        self.ws = websocket.create_connection(ws_url, suppress_origin=True, enable_multithread=True)
+        self.ws_url = ws_url
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, list] = {}  # id -> [Event, reply]
+        self._handlers: Dict[str, List[Callable[[dict], None]]] = {}
+        self._send_lock = threading.Lock()
+        self.alive = True
+        self._reader = threading.Thread(target=self._read, name="cdp-reader", daemon=True)
+        self._reader.start()
+
+    @classmethod
+    def attach(cls, debugger_addr: str = DEBUGGER_ADDR, url_hint: str = "futures") -> "CDPSession":
+        """Connects to the first page whose URL contains url_hint (else the first page)."""
+        targets = page_targets(debugger_addr)
+        if not targets: raise CDPError(f"no page targets at {debugger_addr}")
+        t = next((t for t in targets if url_hint in t.get("url", "")), targets[0])
+        return cls(t["webSocketDebuggerUrl"])
+
+    def on(self, method: str, fn: Callable[[dict], None]) -> None:
+        self._handlers.setdefault(method, []).append(fn)
+
+    def send(self, method: str, params: Optional[dict] = None) -> int:
+        i = next(self._ids)
+        msg = json.dumps({"id": i, "method": method, "params": params or {}})
+        with self._send_lock: self.ws.send(msg)
+        return i
+
+    def call(self, method: str, params: Optional[dict] = None, timeout: float = 10.0) -> dict:
+        i = next(self._ids)
+        slot = [threading.Event(), None]
+        self._pending[i] = slot
+        try:
+            msg = json.dumps({"id": i, "method": method, "params": params or {}})
+            with self._send_lock: self.ws.send(msg)
+            if not slot[0].wait(timeout): raise CDPError(f"{method}: no reply in {timeout}s")
+        finally:
+            self._pending.pop(i, None)
+        reply = slot[1]
+        if "error" in reply: raise CDPError(f"{method}: {reply['error']}")
+        return reply.get("result", {})
+
+    def _read(self) -> None:
+        try:
+            while True:
+                msg = json.loads(self.ws.recv())
+                i = msg.get("id")
+                if i is not None:
+                    slot = self._pending.get(i)
+                    if slot is not None: slot[1] = msg; slot[0].set()
+                    continue
+                for fn in self._handlers.get(msg.get("method"), ()):
+                    try: fn(msg.get("params", {}))
+                    except Exception as e: log(f"[CDP] handler error: {e}")
+        except Exception as e:
+            if self.alive: log(f"[CDP] connection lost: {e}")
+        finally:
+            self.alive = False
+            for slot in list(self._pending.values()):
+                slot[1] = {"error": "connection closed"}; slot[0].set()
+
+    def close(self) -> None:
+        self.alive = False
+        try: self.ws.close()
+        except Exception: pass
+
+
+class CDPTrader(BaseTrader):
+    """MexcTrader equivalent over raw CDP. click_mode "input" = trusted mouse events, "js" = element.click()."""
+    def __init__(self, debugger_addr: str = DEBUGGER_ADDR, url_hint: str = "futures",
+                 click_mode: str = "input", confirm_timeout: float = CONFIRM_TIMEOUT_SEC):
+        self.cdp = CDPSession.attach(debugger_addr, url_hint)
+        self.click_mode = click_mode
+        self.confirm_timeout = confirm_timeout
+        self.rects: Dict[str, Optional[list]] = {}  # cached button centres (CSS px, viewport)
+        self.staged_qty: Optional[float] = None     # qty known to be in the order form
+        self.last_confirm_ns = 0
+        self._toast = threading.Condition()
+        self._toast_seq = 0; self._toast_text = ""; self._toast_ns = 0
+        self.cdp.on("Runtime.bindingCalled", self._on_binding)
+        self.cdp.on("Page.frameNavigated", self._on_navigated)
+        self.cdp.call("Runtime.enable"); self.cdp.call("Page.enable")
+        self.cdp.call("Runtime.addBinding", {"name": BINDING})
+        self.cdp.call("Page.addScriptToEvaluateOnNewDocument", {"source": _PAGE_JS})
+        self._eval(_PAGE_JS)
+        self.refresh()
+
+    # --- BaseTrader ---
+    def prepare_next_entry_qty(self, qty: float) -> Optional[bool]:
+        qty = float(qty)
+        if qty == self.staged_qty: return True
+        self.staged_qty = None
+        try:
+            v = str(qty)
+            got = self._eval(f"__mexcbot.setQty({json.dumps(v)})")
+            if got == v:
+                self.staged_qty = qty; return True
+            log(f"[CDP] 入力値が一致しません: {got!r} != {v!r}")
+        except Exception as e:
+            log(f"[CDP] set_qty failed: {e}")
+        return False
+
+    def check_qty(self) -> Optional[bool]:
+        staged = self.staged_qty
+        if staged is None: return None
+        try: intact = self._eval("__mexcbot.getQty()") == str(staged)
+        except Exception: intact = False
+        if not intact:
+            log(f"[CDP] staged qty drifted; re-typing {staged}")
+            self.staged_qty = None; self.prepare_next_entry_qty(staged)
+        return intact
+
+    def fast_click_long(self) -> Optional[bool]:
+        return self._order("long", FILL_MESSAGE)
+
+    def fast_click_short(self) -> Optional[bool]:
+        return self._order("short", FILL_MESSAGE)
+
+    def fast_click_settle(self) -> Optional[bool]:
+        try:
+            seq = self._toast_seq
+            if not self._click("close_all"): return False
+            # confirm modal: wait in-page for the button instead of a fixed sleep
+            pt = self._eval(f"__mexcbot.waitFor('confirm', {int(self.confirm_timeout * 1e3)})",
+                            await_promise=True, timeout=self.confirm_timeout + 1.0)
+            if not pt:
+                log("[CDP] Close All の確認モーダルが出ませんでした"); return False
+            self._mouse_click(pt)
+            return self._await_fill(seq, CLOSE_ALL_MESSAGE)
+        except Exception as e:
+            log(f"[CDP] settle failed: {e}"); return False
+
+    def heartbeat(self) -> bool:
+        try:
+            ok = bool(self._eval("__mexcbot.health()", timeout=HEALTH_WAIT_SEC))
+            self.refresh(HEALTH_WAIT_SEC)
+            return ok and self.cdp.alive
+        except Exception:
+            return False
+
+    def read_position(self) -> Optional[str]:
+        try: return self._eval("__mexcbot.position()", timeout=HEALTH_WAIT_SEC)
+        except Exception: return None
+
+    def last_fill_ns(self) -> int:
+        return self.last_confirm_ns
+
+    # --- internals ---
+    def refresh(self, timeout: float = 10.0) -> Dict[str, Optional[list]]:
+        """Re-resolve and verify every button centre (one evaluate round-trip)."""
+        self.rects = self._eval("__mexcbot.rects()", timeout=timeout) or {}
+        return self.rects
+
+    def _eval(self, expr: str, await_promise: bool = False, timeout: float = 10.0):
+        r = self.cdp.call("Runtime.evaluate", {"expression": expr, "returnByValue": True,
+                                               "awaitPromise": await_promise}, timeout)
+        if "exceptionDetails" in r:
+            raise CDPError(r["exceptionDetails"].get("text", "evaluate failed"))
+        return r.get("result", {}).get("value")
+
+    def _mouse_click(self, pt) -> None:
+        x, y = pt
+        for t in ("mousePressed", "mouseReleased"):
+            self.cdp.send("Input.dispatchMouseEvent", {"type": t, "x": x, "y": y, "button": "left", "clickCount": 1})
+
+    def _click(self, name: str) -> bool:
+        if self.click_mode == "js":
+            return bool(self._eval(f"__mexcbot.click({json.dumps(name)})"))
+        pt = self.rects.get(name)
+        if pt:  # one round trip: the cached point must still hit the button (layout may have moved)
+            pt = self._eval(f"__mexcbot.at({json.dumps(name)}, {pt[0]}, {pt[1]})")
+            self.rects[name] = pt
+        else:
+            pt = self.refresh().get(name)
+        if not pt:
+            log(f"[CDP] {name} button not clickable"); return False
+        self._mouse_click(pt)
+        return True
+
+    def _order(self, name: str, expect: str) -> bool:
+        try:
+            seq = self._toast_seq
+            if not self._click(name): return False
+            return self._await_fill(seq, expect)
+        except Exception as e:
+            log(f"[CDP] {name} failed: {e}"); return False
+
+    def _await_fill(self, seq: int, expect: str) -> bool:
+        with self._toast:
+            if not self._toast.wait_for(lambda: self._toast_seq > seq, self.confirm_timeout):
+                log("[CDP] 約定トーストがタイムアウトしました"); return False
+            text, t_ns = self._toast_text, self._toast_ns
+        if expect in text:
+            self.last_confirm_ns = t_ns
+            return True
+        log(f"[CDP] 成功トーストを検知できませんでした: {text!r}")
+        return False
+
+    def _on_binding(self, p: dict) -> None:
+        if p.get("name") != BINDING: return
+        t_ns = time.monotonic_ns()
+        with self._toast:
+            self._toast_seq += 1; self._toast_text = p.get("payload", ""); self._toast_ns = t_ns
+            self._toast.notify_all()
+
+    def _on_navigated(self, p: dict) -> None:
+        if not p.get("frame", {}).get("parentId"):
+            self.rects = {}  # main frame reloaded: cached coordinates are stale
+
+    def close(self) -> None:
+        self.cdp.close()
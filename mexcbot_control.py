@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mexcbot_control.py
+Runtime control without restarting the stream: swap the StrategyConfig, pause /
+resume entries, flatten positions.
+
+- ControlServer: JSON over HTTP on 127.0.0.1 (local only)
+    GET  /state                         config + position / pause / blind per symbol
+    POST /config   {"net_entry": 900}   or {"suiusdt": {"net_entry": 900}, ...}
+    POST /pause    /resume    /flatten  (?symbol=suiusdt; default every symbol)
+- ConfigWatcher: polls a JSON file (same shape as POST /config) and applies it
+  whenever it changes
+Updates are partial: keys not given keep their current value. Every new config is
+validated before any monitor is touched, then each monitor swaps it between two
+events (StrategyMonitor.apply_config), keeping its windows, timers and position.
+  curl -s localhost:9109/state
+  curl -s -XPOST localhost:9109/config -d '{"net_entry": 900, "qty": 50}'
+  curl -s -XPOST localhost:9109/pause
+"""
+from __future__ import annotations
+import json, os, threading
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Iterable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from mexcbot_metrics import log as _log
+
+COMMANDS = ("pause", "resume", "flatten")
+
+
+def split_updates(monitors: Dict[str, Any], doc: Any, others: Iterable[str] = ()) -> Dict[str, Dict[str, Any]]:
+    """
+    {field: value} applies to every symbol, {symbol: {field: value}} to the named ones.
+    `others`: symbols run by other shards; their entries are skipped instead of rejected.
+    """
+    if not isinstance(doc, dict): raise ValueError("expected a JSON object")
+    others = set(others)
+    known = set(monitors) | others  # symbol keys are lowercase like the stream names
+    doc = {k.lower() if isinstance(k, str) and k.lower() in known else k: v for k, v in doc.items()}
+    syms = [k for k in doc if k in monitors or k in others]
+    if not syms:
+        return {sym: doc for sym in monitors}
+    if len(syms) != len(doc): raise ValueError(f"unknown symbols: {sorted(set(doc) - set(syms))}")
+    out = {}
+    for sym, upd in doc.items():
+        if not isinstance(upd, dict): raise ValueError(f"{sym}: expected an object of config fields")
+        if sym in monitors: out[sym] = upd
+    return out
+
+
+def apply_updates(monitors: Dict[str, Any], doc: Any, reason: str = "control",
+                  others: Iterable[str] = ()) -> Dict[str, Dict[str, float]]:
+    """All-or-nothing: a bad key or value for any symbol raises before anything is swapped."""
+    new = {sym: monitors[sym].cfg.updated(upd) for sym, upd in split_updates(monitors, doc, others).items()}
+    for sym, cfg in new.items():
+        monitors[sym].apply_config(cfg, reason)
+    return {sym: asdict(cfg) for sym, cfg in new.items()}
+
+
+def command(monitors: Dict[str, Any], cmd: str, symbol: Optional[str] = None, reason: str = "control") -> Dict[str, Any]:
+    if cmd not in COMMANDS: raise ValueError(f"unknown command: {cmd}")
+    if symbol is not None and symbol not in monitors: raise ValueError(f"unknown symbol: {symbol}")
+    out = {}
+    for sym in ([symbol] if symbol else list(monitors)):
+        m = monitors[sym]
+        if cmd == "flatten": out[sym] = m.flatten(reason)
+        else: m.set_paused(cmd == "pause", reason); out[sym] = m.paused
+    return out
+
+
+def state(monitors: Dict[str, Any]) -> Dict[str, Any]:
+    return {sym: {"config": asdict(m.cfg), "position": m.position, "paused": m.paused, "blind": m.blind,
+                  "exec_healthy": m.exec_healthy, "config_reloads": m.cfg_reloads}
+            for sym, m in monitors.items()}
+
+
+class ControlServer:
+    """Local JSON control endpoint on a background thread (see the module docstring)."""
+    def __init__(self, monitors: Dict[str, Any], port: int, host: str = "127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        mons = monitors
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, code: int, obj: Any) -> None:
+                body = json.dumps(obj).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers(); self.wfile.write(body)
+            def do_GET(self):
+                if urlsplit(self.path).path != "/state": return self._reply(404, {"error": "not found"})
+                self._reply(200, state(mons))
+            def do_POST(self):
+                u = urlsplit(self.path); name = u.path.strip("/")
+                symbol = (parse_qs(u.query).get("symbol") or [None])[0]
+                try:
+                    if name == "config":
+                        n = int(self.headers.get("Content-Length") or 0)
+                        self._reply(200, apply_updates(mons, json.loads(self.rfile.read(n) or b"{}"), "http"))
+                    elif name in COMMANDS:
+                        self._reply(200, command(mons, name, symbol, "http"))
+                    else:
+                        self._reply(404, {"error": "not found"})
+                except (KeyError, ValueError, TypeError) as e:  # bad JSON / key / value: nothing was applied
+                    self._reply(400, {"error": str(e.args[0]) if e.args else repr(e)})
+            def log_message(self, *a): pass
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "ControlServer":
+        threading.Thread(target=self.httpd.serve_forever, name="control-http", daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        self.httpd.shutdown(); self.httpd.server_close()
+
+
+class ConfigWatcher(threading.Thread):
+    """
+    Polls `path` every `interval` seconds and applies it when its mtime or size
+    changes (and once at start). A file that fails to parse or validate is logged
+    and skipped; the running config stays as it was.
+    """
+    def __init__(self, path: str, monitors: Dict[str, Any], interval: float = 1.0,
+                 log: Callable[[str], None] = _log, others: Iterable[str] = ()):
+        super().__init__(name="config-watch", daemon=True)
+        self.path = path; self.monitors = monitors; self.interval = float(interval); self.log = log
+        self.others = tuple(others)  # symbols of other shards sharing the same file
+        self.applied = 0; self.errors = 0
+        self._sig = None
+        self._stop_evt = threading.Event()
+
+    def poll(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        sig = (st.st_mtime_ns, st.st_size)
+        if sig == self._sig: return False
+        self._sig = sig
+        try:
+            with open(self.path, encoding="utf-8") as f: doc = json.load(f)
+            apply_updates(self.monitors, doc, f"file {os.path.basename(self.path)}", self.others)
+            self.applied += 1
+            return True
+        except (OSError, KeyError, ValueError, TypeError) as e:
+            self.errors += 1
+            self.log(f"[CONFIG] {self.path} ignored: {e}")
+            return False
+
+    def run(self):
+        while not self._stop_evt.is_set():
+            self.poll()
+            self._stop_evt.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stop_evt.set()
@@ -5,24 +5,20 @@ mexcbot_core.py
 A minimal gated scalper bot (DryRun by default).
 """
 from __future__ import annotations
-import json, time, threading, traceback
+import heapq, os, random, time, threading, traceback
+from array import array
 from collections import deque
+from dataclasses import dataclass, fields, replace
 from datetime import datetime
 from typing import Callable, Optional, Dict, Any
-try:
-    import websocket  # websocket-client
-except Exception:
-    websocket = None
-
-# External UI executor module
-try:
-    from mexcbot_executor import SeleniumBot
-except Exception:
-    SeleniumBot = None  # Import lazily in MexcTrader to allow DryRun
+import mexcbot_metrics as metrics
+from mexcbot_book import BOOK_LEVELS, TopBook
+from mexcbot_decode import KIND_TRADE, StreamDecoder, build_stream_url, streams_from_url, symbol_streams
 
 # ===== Settings =====
 SYMBOL              = "suiusdt"
-BINANCE_WS_URL      = f"wss://stream.binance.com:9443/stream?streams={SYMBOL}@trade/{SYMBOL}@aggTrade/{SYMBOL}@depth5@100ms"
+TRADE_SOURCE        = "merge"  # "trade" / "aggTrade" / "merge" (both, deduped by trade id)
+BINANCE_WS_URL      = build_stream_url(symbol_streams(SYMBOL, TRADE_SOURCE))
 NET_ENTRY           = 800     # cumulative net volume threshold to enter
 NET_EXIT            = 752     # reverse net volume threshold to exit
 SPREAD_TIGHT_USD    = 0.00020  # gate: tight spread
@@ -32,57 +28,172 @@ MAX_HOLD_SEC        = 5.0
 TIGHT_GATE_WINDOW_SEC = 2.0
 COOLDOWN_SEC          = 8.0
 BURST_WINDOW_SEC      = 0.4
+# order-book gates from the top-N book (mexcbot_book); 0 = off
+MIN_IMBALANCE         = 0.0  # long needs L1 queue imbalance >= this, short <= -this (-1..1)
+MAX_DEPTH_SPREAD_USD  = 0.0  # qty-weighted ask - bid over the top levels must be <= this
+
+DECODER_BACKEND = "auto"  # "orjson" if installed, else "json"
+
+# WS supervision: reconnect with jittered exponential backoff, ping/pong liveness,
+# and a "blind" state (no entries) while the feed is down, stale or resyncing
+WS_PING_INTERVAL_SEC   = 15.0
+WS_PING_TIMEOUT_SEC    = 10.0   # no pong within this -> connection is dropped and redialed
+WS_BACKOFF_BASE_SEC    = 0.5
+WS_BACKOFF_MAX_SEC     = 30.0
+WS_STABLE_SEC          = 30.0   # a connection that lived this long resets the backoff
+WS_STALE_SEC           = 3.0    # no frame for this long -> blind
+WS_STALE_RECONNECT_SEC = 10.0   # no frame for this long -> force a reconnect
+RESYNC_WARMUP_SEC      = TIGHT_GATE_WINDOW_SEC  # after a trade-id gap the net window is incomplete
+BLIND_POLICY           = "hold"  # open position while blind: "hold" (TP/SL/max-hold still apply) / "flatten"
 
 USE_SELENIUM    = True
+EXEC_BACKEND    = "selenium"  # "selenium" (SeleniumBot via chromedriver) / "cdp" (mexcbot_cdp, DevTools directly)
+USE_ASYNC_EXEC  = True   # run the trader on its own thread; the WS thread never waits for the browser
+QTY_VERIFY_SEC  = 5.0    # re-read the staged qty from the order form this often while no order is queued (0 = off)
+
+# executor health supervision (HealthSupervisor; needs USE_ASYNC_EXEC)
+HEALTH_CHECK_SEC   = 5.0   # heartbeat + page position read, queued behind orders on the executor
+HEALTH_WAIT_SEC    = 0.5   # page waits inside a health check (an order that arrives mid-check waits on it)
+HEALTH_FAIL_LIMIT  = 2     # consecutive failed checks -> unhealthy (no new entries)
+RECONCILE_CONFIRM  = 2     # consecutive checks that must disagree before the position is corrected
+SETTLE_RETRIES     = 3     # failed settle -> retry this many times, then escalate (entries stay blocked)
+SETTLE_RETRY_SEC   = 0.5   # retry n waits n * this
 DEBUGGER_ADDR   = "127.0.0.1:9222"
 
+LATENCY_TRACE   = True   # per-stage latency histograms (mexcbot_latency), dumped every LATENCY_DUMP_SEC
+LATENCY_DUMP_SEC = 60.0
+RECORD_DIR      = None   # e.g. "ticks": record trades/top-of-book via mexcbot_tickstore
+METRICS_PORT    = 9108   # Prometheus text endpoint http://127.0.0.1:9108/metrics (None = off)
+CONTROL_PORT    = 9109   # mexcbot_control HTTP API: config swap, pause/resume/flatten (None = off)
+CONFIG_FILE     = None   # e.g. "strategy.json": watched; edits are applied live (mexcbot_control)
+CONFIG_WATCH_SEC = 1.0
+
 # 追加：数量指定（従来のQTY_SUIを使用）
 QTY_SUI = 100.0
 
+# ===== Strategy Config =====
+@dataclass(frozen=True)
+class StrategyConfig:
+    """Tuning knobs of StrategyMonitor. Defaults are the module-level settings above."""
+    net_entry: float             = NET_ENTRY
+    net_exit: float              = NET_EXIT
+    spread_tight_usd: float      = SPREAD_TIGHT_USD
+    take_profit_pct: float       = TAKE_PROFIT_PCT
+    stop_loss_pct: float         = STOP_LOSS_PCT
+    max_hold_sec: float          = MAX_HOLD_SEC
+    tight_gate_window_sec: float = TIGHT_GATE_WINDOW_SEC
+    cooldown_sec: float          = COOLDOWN_SEC
+    burst_window_sec: float      = BURST_WINDOW_SEC
+    qty: float                   = QTY_SUI
+    min_imbalance: float         = MIN_IMBALANCE
+    max_depth_spread_usd: float  = MAX_DEPTH_SPREAD_USD
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "StrategyConfig":
+        """Unknown keys raise (KeyError); values are coerced to float and validated (ValueError)."""
+        cfg = cls(**cls._coerce(d))
+        cfg.validate()
+        return cfg
+
+    @classmethod
+    def _coerce(cls, d: Dict[str, Any]) -> Dict[str, float]:
+        names = {f.name for f in fields(cls)}
+        bad = set(d) - names
+        if bad: raise KeyError(f"unknown config keys: {sorted(bad)}")
+        return {k: float(v) for k, v in d.items()}
+
+    def updated(self, d: Dict[str, Any]) -> "StrategyConfig":
+        """Copy with the keys in d replaced; coerced and validated like from_dict."""
+        cfg = replace(self, **self._coerce(d))
+        cfg.validate()
+        return cfg
+
+    def validate(self) -> None:
+        for f in fields(self):
+            v = getattr(self, f.name)
+            if not (v >= 0.0 and v != float("inf")): raise ValueError(f"{f.name} must be finite and >= 0, got {v}")
+        if self.qty <= 0 or self.tight_gate_window_sec <= 0 or self.burst_window_sec <= 0:
+            raise ValueError("qty and the window lengths must be > 0")
+
 # ===== Trader Interfaces =====
 class BaseTrader:
-    def prepare_next_entry_qty(self, qty: float) -> None: raise NotImplementedError
-    def fast_click_long(self) -> None: raise NotImplementedError
-    def fast_click_short(self) -> None: raise NotImplementedError
-    def fast_click_settle(self) -> None: raise NotImplementedError
+    """Order actions may return False on a failed fill; None means "not reported"."""
+    def prepare_next_entry_qty(self, qty: float) -> Optional[bool]: raise NotImplementedError
+    def fast_click_long(self) -> Optional[bool]: raise NotImplementedError
+    def fast_click_short(self) -> Optional[bool]: raise NotImplementedError
+    def fast_click_settle(self) -> Optional[bool]: raise NotImplementedError
     def heartbeat(self) -> bool: return True
+    def check_qty(self) -> Optional[bool]:
+        """Re-read the staged qty from the order form and re-type it if it drifted.
+        True = intact, False = drifted (repair attempted), None = nothing staged / can't tell."""
+        return None
+    def read_position(self) -> Optional[str]:
+        """Position as shown by the venue: "long" / "short" / "flat"; None if the backend can't tell."""
+        return None
+    def last_fill_ns(self) -> int:
+        """time.monotonic_ns() at which the last fill was confirmed; 0 if the backend can't tell."""
+        return 0
 
 class MexcTrader(BaseTrader):
     """Adapter that delegates UI operations to mexcbot_executor.SeleniumBot."""
-    def __init__(self):
-        if SeleniumBot is None:
-            raise RuntimeError("mexcbot_executor.SeleniumBot not available")
-        self.ui = SeleniumBot()
-        self._qty = 0.0
-    def prepare_next_entry_qty(self, qty: float) -> None:
-        self._qty = float(qty)
+    def __init__(self, debugger_addr: str = DEBUGGER_ADDR):
+        try:
+            from mexcbot_executor import SeleniumBot  # pulls in selenium; only live mode pays for it
+        except Exception as e:
+            raise RuntimeError(f"mexcbot_executor.SeleniumBot not available: {e}")
+        self.ui = SeleniumBot(debugger_addr)
+        self.staged_qty: Optional[float] = None  # qty known to be in the order form (None = unknown)
+    def prepare_next_entry_qty(self, qty: float) -> Optional[bool]:
+        qty = float(qty)
+        if qty == self.staged_qty: return True  # form already armed; no typing
+        self.staged_qty = None
         try:
-            self.ui.set_qty(self._qty, mode=1)
+            ok = bool(self.ui.set_qty(qty, mode=1))
         except Exception:
-            pass
-    def fast_click_long(self) -> None:
-        self.ui.open_long()
-    def fast_click_short(self) -> None:
-        self.ui.open_short()
-    def fast_click_settle(self) -> None:
+            ok = False
+        if ok: self.staged_qty = qty
+        return ok
+    def check_qty(self) -> Optional[bool]:
+        staged = self.staged_qty
+        if staged is None: return None
+        try: intact = self.ui.get_qty(mode=1) == str(staged)
+        except Exception: intact = False
+        if not intact:
+            metrics.log(f"[EXEC] staged qty drifted; re-typing {staged}")
+            self.staged_qty = None; self.prepare_next_entry_qty(staged)
+        return intact
+    def fast_click_long(self) -> Optional[bool]:
+        return bool(self.ui.open_long())
+    def fast_click_short(self) -> Optional[bool]:
+        return bool(self.ui.open_short())
+    def fast_click_settle(self) -> Optional[bool]:
         # Use Close All by default
-        self.ui.close_all()
+        return bool(self.ui.close_all())
     def heartbeat(self) -> bool:
         try:
-            return bool(self.ui.heartbeat())
+            return bool(self.ui.heartbeat(HEALTH_WAIT_SEC))
         except Exception:
             return False
+    def read_position(self) -> Optional[str]:
+        try:
+            if self.ui.is_position_open("long"): return "long"
+            if self.ui.is_position_open("short"): return "short"
+            return "flat"
+        except Exception:
+            return None
+    def last_fill_ns(self) -> int:
+        return getattr(self.ui, "last_confirm_ns", 0)
 
 class DryRunTrader(BaseTrader):
     def __init__(self): self.qty = 0.0
     def prepare_next_entry_qty(self, qty: float) -> None:
-        self.qty = qty; print(f"[DRY] set qty={qty}")
+        self.qty = qty; metrics.log(f"[DRY] set qty={qty}")
     def fast_click_long(self) -> None:
-        print(f"[DRY] CLICK LONG qty={self.qty}")
+        metrics.log(f"[DRY] CLICK LONG qty={self.qty}")
     def fast_click_short(self) -> None:
-        print(f"[DRY] CLICK SHORT qty={self.qty}")
+        metrics.log(f"[DRY] CLICK SHORT qty={self.qty}")
     def fast_click_settle(self) -> None:
-        print("[DRY] CLICK SETTLE (close position)")
+        metrics.log("[DRY] CLICK SETTLE (close position)")
 
 class SeleniumTrader(BaseTrader):
     def __init__(self, debugger_addr: str):
@@ -97,49 +208,315 @@ class SeleniumTrader(BaseTrader):
         self.SELECTOR_SHORT_BUTTON= None
         self.SELECTOR_CLOSE_BUTTON= None
         self.qty_cache = 0.0
-        print(f"[Selenium] attached to {debugger_addr}.")
+        metrics.log(f"[Selenium] attached to {debugger_addr}.")
     def _find(self, selector: Optional[str]):
         if not selector:
-            print("[Selenium] セレクタ未設定。ログのみ。"); return None
+            metrics.log("[Selenium] セレクタ未設定。ログのみ。"); return None
         return self.driver.find_element(self.By.CSS_SELECTOR, selector)
     def prepare_next_entry_qty(self, qty: float) -> None:
         el = self._find(self.SELECTOR_QTY_INPUT)
-        if el is None: self.qty_cache=qty; print(f"[Selenium] qty={qty}（ログのみ）"); return
-        el.clear(); el.send_keys(str(qty)); self.qty_cache=qty; print(f"[Selenium] set qty={qty}")
+        if el is None: self.qty_cache=qty; metrics.log(f"[Selenium] qty={qty}（ログのみ）"); return
+        el.clear(); el.send_keys(str(qty)); self.qty_cache=qty; metrics.log(f"[Selenium] set qty={qty}")
     def fast_click_long(self) -> None:
         el = self._find(self.SELECTOR_LONG_BUTTON)
-        if el is None: print(f"[Selenium] LONG qty={self.qty_cache}（ログのみ）"); return
-        el.click(); print("[Selenium] LONG clicked")
+        if el is None: metrics.log(f"[Selenium] LONG qty={self.qty_cache}（ログのみ）"); return
+        el.click(); metrics.log("[Selenium] LONG clicked")
     def fast_click_short(self) -> None:
         el = self._find(self.SELECTOR_SHORT_BUTTON)
-        if el is None: print(f"[Selenium] SHORT qty={self.qty_cache}（ログのみ）"); return
-        el.click(); print("[Selenium] SHORT clicked")
+        if el is None: metrics.log(f"[Selenium] SHORT qty={self.qty_cache}（ログのみ）"); return
+        el.click(); metrics.log("[Selenium] SHORT clicked")
     def fast_click_settle(self) -> None:
         el = self._find(self.SELECTOR_CLOSE_BUTTON)
-        if el is None: print("[Selenium] SETTLE（ログのみ）"); return
-        el.click(); print("[Selenium] SETTLE clicked")
+        if el is None: metrics.log("[Selenium] SETTLE（ログのみ）"); return
+        el.click(); metrics.log("[Selenium] SETTLE clicked")
     def heartbeat(self) -> bool: return True
 
-# ===== Net Volume Aggregator =====
-class NetVolumeWindow:
-    def __init__(self, window_sec: float):
-        self.window = float(window_sec)
-        self._win = deque()  # (ts, signed_qty)
+def make_ui_trader(backend: str = EXEC_BACKEND, debugger_addr: str = DEBUGGER_ADDR) -> BaseTrader:
+    """Browser-driving trader for the MEXC tab behind `debugger_addr`."""
+    if backend == "cdp":
+        from mexcbot_cdp import CDPTrader
+        return CDPTrader(debugger_addr)
+    if backend == "selenium":
+        return MexcTrader(debugger_addr)
+    raise ValueError(f"unknown executor backend: {backend}")
+
+# ===== Async Execution =====
+class ExecReport:
+    """Result of one executor command, delivered to the monitor from the worker thread."""
+    __slots__ = ("cmd", "ok", "cancelled", "submitted", "started", "finished", "detail")
+    def __init__(self, cmd: str, ok: bool, cancelled: bool = False,
+                 submitted: float = 0.0, started: float = 0.0, finished: float = 0.0, detail=None):
+        self.cmd = cmd; self.ok = ok; self.cancelled = cancelled
+        self.submitted = submitted; self.started = started; self.finished = finished
+        self.detail = detail  # "health": page position from read_position()
+    def __repr__(self) -> str:
+        return (f"ExecReport({self.cmd} ok={self.ok} cancelled={self.cancelled} "
+                f"queued={(self.started - self.submitted) * 1e3:.1f}ms took={(self.finished - self.started) * 1e3:.1f}ms)")
+
+class AsyncExecutor(BaseTrader):
+    """
+    Runs a (blocking) BaseTrader on a dedicated worker thread behind a bounded
+    command queue, so the market-data thread only enqueues and returns.
+    Superseded commands are coalesced before they reach the browser:
+      - a newer entry replaces a queued entry that has not started yet
+      - a settle cancels a queued, not yet started entry (both are dropped)
+      - repeated settles / qty updates collapse into one
+    A settle arriving while an entry is in flight (waiting for its fill toast)
+    is queued and runs right after it. Every entry/settle (and failed qty) yields
+    an ExecReport. After each settle, and whenever verify_every seconds have passed
+    since the last check and the queue is empty, the worker has the trader check the
+    staged qty (check_qty), so the order form stays armed off the signal path. The
+    schedule runs off the last check, not off idle time, so periodic health commands
+    do not starve it.
+    check_health() queues a "health" command (heartbeat + read_position) that
+    yields to any entry/settle submitted after it. Once started it can't be
+    overtaken, so its page waits are capped at HEALTH_WAIT_SEC by the trader, and
+    the position read is skipped when an order is already waiting.
+    """
+    ENTRY = ("long", "short")
+
+    def __init__(self, trader: BaseTrader, on_report: Optional[Callable[[ExecReport], None]] = None,
+                 maxsize: int = 16):
+        self.trader = trader
+        self.on_report = on_report
+        self.maxsize = int(maxsize)
+        self._q: deque = deque()  # [cmd, arg, submitted_ts]
+        self._cv = threading.Condition()
+        self._stop = False
+        self.in_flight: Optional[str] = None
+        self.coalesced = 0; self.cancelled = 0; self.rejected = 0
+        self.verify_every = QTY_VERIFY_SEC
+        self.qty_checks = 0; self.qty_repairs = 0
+        self._last_verify = time.monotonic()
+        self.tracer = None  # mexcbot_latency.LatencyTracer (optional)
+        self._worker = threading.Thread(target=self._run, name="exec-worker", daemon=True)
+        self._worker.start()
+
+    # --- BaseTrader (called from the market-data thread; never blocks on the browser) ---
+    def prepare_next_entry_qty(self, qty: float) -> None: self._submit("qty", float(qty))
+    def fast_click_long(self) -> None: self._submit("long")
+    def fast_click_short(self) -> None: self._submit("short")
+    def fast_click_settle(self) -> None: self._submit("settle")
+    def heartbeat(self) -> bool: return self._worker.is_alive()
+    def check_health(self) -> None: self._submit("health")
 
-    def add(self, qty: float, is_buy: bool):
+    def _submit(self, cmd: str, arg=None) -> None:
         now = time.time()
-        signed = qty if is_buy else -qty
-        self._win.append((now, signed))
-        self._cleanup(now)
+        dropped = []
+        with self._cv:
+            q = self._q
+            if cmd == "health":
+                if any(c[0] == "health" for c in q): self.coalesced += 1; cmd = None
+            elif cmd == "settle":
+                entry = next((c for c in q if c[0] in self.ENTRY), None)
+                if entry is not None:
+                    q.remove(entry); self.cancelled += 1
+                    dropped.append(ExecReport(entry[0], False, True, entry[2], now, now))
+                    dropped.append(ExecReport("settle", True, True, now, now, now))
+                    cmd = None
+                elif any(c[0] == "settle" for c in q):
+                    self.coalesced += 1; cmd = None
+            elif cmd in self.ENTRY or cmd == "qty":
+                kinds = self.ENTRY if cmd in self.ENTRY else ("qty",)
+                for c in [c for c in q if c[0] in kinds]:
+                    q.remove(c); self.coalesced += 1
+                    if c[0] in self.ENTRY:
+                        dropped.append(ExecReport(c[0], False, True, c[2], now, now))
+            if cmd is not None:
+                if len(q) >= self.maxsize:
+                    self.rejected += 1
+                    dropped.append(ExecReport(cmd, False, False, now, now, now))
+                else:
+                    tr = self.tracer
+                    stamps = tr.take_decision() if tr is not None and cmd in ("long", "short", "settle") else None
+                    q.append([cmd, arg, now, stamps]); self._cv.notify()
+                    if cmd != "health":  # orders overtake a queued health check
+                        hc = next((c for c in q if c[0] == "health"), None)
+                        if hc is not None: q.remove(hc); q.append(hc)
+        for r in dropped:
+            if r.cmd != "qty": self._report(r)
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                idle = False
+                while not self._q and not self._stop:
+                    wait = None
+                    if self.verify_every:
+                        wait = self._last_verify + self.verify_every - time.monotonic()
+                        if wait <= 0: idle = True; break
+                    self._cv.wait(wait)
+                if self._stop: return
+                if idle:
+                    self.in_flight = "verify"
+                else:
+                    cmd, arg, submitted, trace = self._q.popleft()
+                    self.in_flight = cmd
+            if idle:
+                self._verify_qty(); self.in_flight = None
+                continue
+            started = time.time()
+            t_call = time.monotonic_ns()
+            detail = None
+            try:
+                if cmd == "health":
+                    res = self.trader.heartbeat()
+                    if res and not self._order_waiting(): detail = self.trader.read_position()
+                    res = bool(res)
+                elif cmd == "qty": res = self.trader.prepare_next_entry_qty(arg)
+                elif cmd == "long": res = self.trader.fast_click_long()
+                elif cmd == "short": res = self.trader.fast_click_short()
+                else: res = self.trader.fast_click_settle()
+                ok = res is not False
+            except Exception as e:
+                metrics.log(f"[EXEC] {cmd} failed: {e}"); ok = False
+            self.in_flight = None
+            if trace is not None and ok and self.tracer is not None:
+                t_fill = self.trader.last_fill_ns()
+                self.tracer.executed(trace[0], trace[1], t_call, t_fill if t_fill >= t_call else 0)
+            if cmd != "qty" or not ok:
+                self._report(ExecReport(cmd, ok, False, submitted, started, time.time(), detail))
+            if cmd == "settle" and self.verify_every:
+                self._verify_qty()  # the cooldown after an exit is the cheapest time to re-arm
+
+    def _order_waiting(self) -> bool:
+        with self._cv: return any(c[0] != "health" for c in self._q)
+
+    def _verify_qty(self) -> None:
+        self._last_verify = time.monotonic()
+        try: res = self.trader.check_qty()
+        except Exception as e:
+            metrics.log(f"[EXEC] qty check failed: {e}"); res = False
+        if res is not None: self.qty_checks += 1
+        if res is False: self.qty_repairs += 1
+
+    def _report(self, r: ExecReport) -> None:
+        if self.on_report is None: return
+        try: self.on_report(r)
+        except Exception: traceback.print_exc()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        with self._cv:
+            self._stop = True; self._cv.notify()
+        self._worker.join(timeout)
+
+# ===== Rolling Net Volume (O(1)) =====
+QTY_SCALE = 100_000_000  # qty is kept as fixed-point int (1e-8) so running totals never drift
+
+class RollingNetVolume:
+    """
+    Incremental replacement for the deque + sum() window (mexcbot_bench.NetVolumeWindow).
+    One ring buffer of flat arrays (timestamp + running totals *before* each print)
+    serves several window lengths: a window's net/buy/sell/count/notional is the
+    current running total minus the total stored at its start cursor, so append is
+    O(1) regardless of the number of windows and eviction only moves cursors.
+    Window 0 is the primary window returned by sum().
+    """
+    _REBASE_AT = 1 << 62
+
+    def __init__(self, windows=(TIGHT_GATE_WINDOW_SEC,), capacity: int = 4096):
+        self.windows = tuple(float(w) for w in windows)
+        if not self.windows:
+            raise ValueError("at least one window is required")
+        cap = 1
+        while cap < capacity: cap <<= 1
+        self._cap = cap; self._mask = cap - 1
+        self._ts   = array("d", bytes(8 * cap))
+        self._cnet = array("q", bytes(8 * cap))  # running signed qty (fixed-point) before slot
+        self._cbuy = array("q", bytes(8 * cap))  # running buy qty (fixed-point) before slot
+        self._cnot = array("d", bytes(8 * cap))  # running notional before slot
+        self._head = 0                             # next write position (monotonic)
+        self._start = [0] * len(self.windows)      # first position inside each window
+        self._net = 0; self._buy = 0; self._notional = 0.0
+        self._longest = self.windows.index(max(self.windows))
+
+    def add(self, now: float, qty: float, is_buy: bool, price: float = 0.0) -> None:
+        head = self._head
+        if head - self._start[self._longest] >= self._cap:
+            self._grow()
+        i = head & self._mask
+        self._ts[i] = now
+        self._cnet[i] = self._net; self._cbuy[i] = self._buy; self._cnot[i] = self._notional
+        q = int(round(qty * QTY_SCALE))
+        if is_buy:
+            self._net += q; self._buy += q
+        else:
+            self._net -= q
+        self._notional += price * qty
+        self._head = head + 1
+        if self._buy >= self._REBASE_AT or self._net <= -self._REBASE_AT:
+            self._rebase()
+        self.advance(now)
+
+    def advance(self, now: float) -> None:
+        """Move each window's start cursor past prints older than the window (no new trade needed)."""
+        ts = self._ts; mask = self._mask; head = self._head; start = self._start
+        for k, w in enumerate(self.windows):
+            cutoff = now - w
+            p = start[k]
+            while p < head and ts[p & mask] < cutoff:
+                p += 1
+            start[k] = p
+
+    def set_windows(self, windows, now: float) -> None:
+        """
+        Change the window lengths in place, keeping every print still held. A window
+        longer than the previous longest only reaches back to that one's start until it
+        has been open for its full length (older prints were already evicted).
+        """
+        windows = tuple(float(w) for w in windows)
+        if not windows:
+            raise ValueError("at least one window is required")
+        lo = self._start[self._longest]
+        self.windows = windows
+        self._start = [lo] * len(windows)
+        self._longest = windows.index(max(windows))
+        self.advance(now)
 
-    def _cleanup(self, now: float):
-        cutoff = now - self.window
-        w = self._win
-        while w and w[0][0] < cutoff:
-            w.popleft()
+    def _grow(self) -> None:
+        lo = self._start[self._longest]; old_mask = self._mask
+        cap = self._cap * 2; mask = cap - 1
+        arrs = []
+        for old, code in ((self._ts, "d"), (self._cnet, "q"), (self._cbuy, "q"), (self._cnot, "d")):
+            new = array(code, bytes(8 * cap))
+            for p in range(lo, self._head):
+                new[p & mask] = old[p & old_mask]
+            arrs.append(new)
+        self._ts, self._cnet, self._cbuy, self._cnot = arrs
+        self._cap = cap; self._mask = mask
 
+    def _rebase(self) -> None:
+        # keep fixed-point totals inside int64; only differences are ever observed
+        lo = self._start[self._longest]; mask = self._mask
+        bn = self._cnet[lo & mask] if lo < self._head else self._net
+        bb = self._cbuy[lo & mask] if lo < self._head else self._buy
+        bx = self._cnot[lo & mask] if lo < self._head else self._notional
+        for p in range(lo, self._head):
+            i = p & mask
+            self._cnet[i] -= bn; self._cbuy[i] -= bb; self._cnot[i] -= bx
+        self._net -= bn; self._buy -= bb; self._notional -= bx
+
+    # --- queries (O(1)) ---
+    def _base(self, k: int, col):
+        p = self._start[k]
+        return col[p & self._mask] if p < self._head else None
+
+    def net(self, k: int = 0) -> float:
+        b = self._base(k, self._cnet)
+        return 0.0 if b is None else (self._net - b) / QTY_SCALE
+    def buy(self, k: int = 0) -> float:
+        b = self._base(k, self._cbuy)
+        return 0.0 if b is None else (self._buy - b) / QTY_SCALE
+    def sell(self, k: int = 0) -> float:
+        return self.buy(k) - self.net(k)
+    def count(self, k: int = 0) -> int:
+        return self._head - self._start[k]
+    def vwap(self, k: int = 0) -> float:
+        b = self._base(k, self._cnot)
+        vol = 2.0 * self.buy(k) - self.net(k)
+        return 0.0 if b is None or vol <= 0 else (self._notional - b) / vol
     def sum(self) -> float:
-        return sum(v for _, v in self._win)
+        return self.net(0)
 
 # ===== Spread Gate =====
 class SpreadGate:
@@ -152,156 +529,703 @@ class SpreadGate:
         if self.last_bid <= 0 or self.last_ask <= 0: return False
         return (self.last_ask - self.last_bid) <= self.tight
 
+# ===== Clock =====
+class WallClock:
+    """Live time source. Anything time-dependent takes a clock so it can be replayed."""
+    def now(self) -> float: return time.time()
+    def call_at(self, ts: float, fn: Callable[[], None]):
+        """Run fn on a timer thread at wall time ts; the returned handle has cancel()."""
+        t = threading.Timer(max(0.0, ts - time.time()), fn)
+        t.daemon = True; t.start()
+        return t
+
+class _ReplayTimer:
+    __slots__ = ("ts", "fn", "cancelled")
+    def __init__(self, ts: float, fn: Callable[[], None]):
+        self.ts = ts; self.fn = fn; self.cancelled = False
+    def cancel(self) -> None: self.cancelled = True
+    def __lt__(self, other: "_ReplayTimer") -> bool: return self.ts < other.ts
+
+class ReplayClock:
+    """Time source advanced by a replay driver; now() is the timestamp of the current event."""
+    def __init__(self, t: float = 0.0):
+        self.t = float(t)
+        self.timers: list = []  # heap of (ts, seq, _ReplayTimer)
+        self._seq = 0
+    def now(self) -> float: return self.t
+    def set(self, t: float) -> None:
+        if self.timers and self.timers[0][0] <= t: self.advance(t)
+        else: self.t = t
+    def call_at(self, ts: float, fn: Callable[[], None]) -> _ReplayTimer:
+        h = _ReplayTimer(ts, fn); self._seq += 1
+        heapq.heappush(self.timers, (ts, self._seq, h))
+        return h
+    def advance(self, t: float) -> None:
+        """Fire due timers in time order (now() reads each timer's own deadline), then move to t."""
+        timers = self.timers
+        while timers and timers[0][0] <= t:
+            ts, _, h = heapq.heappop(timers)
+            if h.cancelled: continue
+            self.t = ts
+            h.fn()
+        self.t = t
+
+WALL_CLOCK = WallClock()
+
 # ===== Gate Timers =====
 class GateTimers:
-    def __init__(self):
+    def __init__(self, clock=None, cfg: Optional[StrategyConfig] = None):
+        self._now = (clock or WALL_CLOCK).now
+        self.cfg = cfg or StrategyConfig()
         self.last_entry_ts = 0.0
         self.cooldown_until = 0.0
         self.last_burst_ts = 0.0
     def can_enter(self) -> bool:
-        now = time.time()
-        return now >= self.cooldown_until and (now - self.last_burst_ts) <= TIGHT_GATE_WINDOW_SEC
+        now = self._now()
+        return now >= self.cooldown_until and (now - self.last_burst_ts) <= self.cfg.tight_gate_window_sec
     def trigger_burst(self) -> None:
-        self.last_burst_ts = time.time()
+        self.last_burst_ts = self._now()
     def set_cooldown(self) -> None:
-        self.cooldown_until = time.time() + COOLDOWN_SEC
-        self.last_entry_ts = time.time()
+        now = self._now()
+        self.cooldown_until = now + self.cfg.cooldown_sec
+        self.last_entry_ts = now
 
 # ===== Monitor & Strategy =====
 class StrategyMonitor:
-    def __init__(self, trader: BaseTrader):
+    def __init__(self, trader: BaseTrader, cfg: Optional[StrategyConfig] = None, clock=None,
+                 log: Callable[[str], None] = metrics.log):
         self.trader = trader
-        self.netwin = NetVolumeWindow(TIGHT_GATE_WINDOW_SEC)
-        self.gate = SpreadGate(SPREAD_TIGHT_USD)
-        self.timers = GateTimers()
+        self.cfg = cfg = cfg or StrategyConfig()
+        self.clock = clock or WALL_CLOCK
+        self._now = self.clock.now
+        self.log = log
+        self.netwin = RollingNetVolume((cfg.tight_gate_window_sec,))
+        self.gate = SpreadGate(cfg.spread_tight_usd)
+        self.book = TopBook(BOOK_LEVELS)  # fed by on_book; on_depth (replay, top of book only) leaves it empty
+        self.timers = GateTimers(self.clock, cfg)
         self.position: Optional[str] = None  # "long" / "short" / None
         self.entry_price = 0.0
-        self.qty_to_use = QTY_SUI
+        self.entry_qty = 0.0
+        self.qty_to_use = cfg.qty
         self.running = False
+        self.tracer = None  # mexcbot_latency.LatencyTracer (optional)
+        self.blind = False  # market data not trustworthy (WSClient blind listener); no entries
+        self.blind_policy = BLIND_POLICY
+        self.exec_healthy = True  # HealthSupervisor verdict; no entries while False
+        self.paused = False  # operator pause (mexcbot_control); exits still run
+        self.cfg_reloads = 0
+        self.epoch = 0  # bumped on every position change (lets reconciliation spot stale reads)
+        self.round_trips = 0
+        self.realized_pnl = 0.0  # quote currency, at decision prices
+        self.realized_ret = 0.0  # sum of per-trade returns
+        self._staged_qty: Optional[float] = None  # qty last sent to the trader's order form
+        self._deadline = None  # max-hold timer armed at entry
+        # on_trade/on_depth run on the WS thread, execution reports on the executor thread,
+        # max-hold deadlines on a timer thread
+        self._lock = threading.RLock()
 
     def on_trade(self, price: float, qty: float, is_buy: bool):
-        self.netwin.add(qty, is_buy)
-        # antiburst: mark event
-        self.timers.trigger_burst()
-
-        net = self.netwin.sum()
-        if self.position is None:
-            if self.gate.is_tight() and self.timers.can_enter():
-                if net >= NET_ENTRY:
-                    self._enter("long", price)
-                elif net <= -NET_ENTRY:
-                    self._enter("short", price)
-        else:
-            # exit logic
-            if self.position == "long":
-                if net <= -NET_EXIT or self._should_take_profit(price) or self._should_stop_loss(price) or self._max_hold_elapsed():
-                    self._exit(price)
-            elif self.position == "short":
-                if net >= NET_EXIT or self._should_take_profit(price) or self._should_stop_loss(price) or self._max_hold_elapsed():
-                    self._exit(price)
+        with self._lock:
+            self.netwin.add(self._now(), qty, is_buy, price)
+            # antiburst: mark event
+            self.timers.trigger_burst()
+
+            net = self.netwin.net()
+            cfg = self.cfg
+            if self.position is None:
+                if not self.blind and not self.paused and self.exec_healthy and self.gate.is_tight() and self.timers.can_enter():
+                    if net >= cfg.net_entry:
+                        if self._book_ok(1): self._enter("long", price)
+                    elif net <= -cfg.net_entry:
+                        if self._book_ok(-1): self._enter("short", price)
+            else:
+                # exit logic
+                if self.position == "long":
+                    if net <= -cfg.net_exit or self._should_take_profit(price) or self._should_stop_loss(price) or self._max_hold_elapsed():
+                        self._exit(price)
+                elif self.position == "short":
+                    if net >= cfg.net_exit or self._should_take_profit(price) or self._should_stop_loss(price) or self._max_hold_elapsed():
+                        self._exit(price)
 
     def on_depth(self, best_bid: float, best_ask: float):
+        with self._lock:
+            self._on_top(best_bid, best_ask)
+
+    def on_book(self, ev):
+        """
+        DepthEvent with levels (WSClient). The top-N book is only kept while a book gate
+        is on; otherwise this is on_depth with the decoder's level 0 (the raw levels are
+        never converted) and the book is dropped, so enabling a gate later waits for a
+        fresh snapshot instead of reading a stale one.
+        """
+        with self._lock:
+            cfg = self.cfg; book = self.book
+            if cfg.min_imbalance or cfg.max_depth_spread_usd:
+                if book.update(ev): self._on_top(book.bid, book.ask)
+            else:
+                if book.synced: book.reset()
+                self._on_top(ev.bid, ev.ask)
+
+    def _on_top(self, best_bid: float, best_ask: float):
         self.gate.update_depth(best_bid, best_ask)
+        if self.position is not None:
+            # TP/SL against the price we could actually close at
+            mark = best_bid if self.position == "long" else best_ask
+            if mark > 0 and (self._should_take_profit(mark) or self._should_stop_loss(mark)):
+                self._exit(mark)
+
+    def _book_ok(self, sign: int) -> bool:
+        """Order-book entry gates (sign +1 long / -1 short). Features are precomputed per book update."""
+        cfg = self.cfg
+        if not (cfg.min_imbalance or cfg.max_depth_spread_usd): return True
+        b = self.book
+        if not b.synced: return False  # gates configured but no book yet (or top-of-book-only replay)
+        if cfg.min_imbalance and sign * b.imbalance < cfg.min_imbalance: return False
+        if cfg.max_depth_spread_usd and b.depth_spread > cfg.max_depth_spread_usd: return False
+        return True
+
+    def _on_deadline(self, entry_ts: float):
+        """MAX_HOLD timer: exit at the mark even if no trade prints (quiet tape)."""
+        with self._lock:
+            if self.position is None or self.timers.last_entry_ts != entry_ts: return  # stale timer
+            mark = self.gate.last_bid if self.position == "long" else self.gate.last_ask
+            self._exit(mark if mark > 0 else self.entry_price, traced=False)
+
+    def arm(self):
+        """Stage the entry qty ahead of the first signal."""
+        with self._lock:
+            self._stage_qty()
+
+    def _stage_qty(self):
+        if self._staged_qty != self.qty_to_use:
+            self.trader.prepare_next_entry_qty(self.qty_to_use)
+            self._staged_qty = self.qty_to_use
+
+    def set_blind(self, blind: bool, reason: str = ""):
+        """WSClient blind listener: pause entries; with the "flatten" policy also close at the last mark."""
+        with self._lock:
+            self.blind = blind
+            if blind: self.book.reset()  # update ids may restart after a reconnect; wait for a fresh snapshot
+            self.log(f"[BLIND] {'on' if blind else 'off'} ({reason}) position={self.position}")
+            if blind and self.position is not None and self.blind_policy == "flatten":
+                mark = self.gate.last_bid if self.position == "long" else self.gate.last_ask
+                self._exit(mark if mark > 0 else self.entry_price, traced=False)
+
+    def apply_config(self, cfg: StrategyConfig, reason: str = "") -> None:
+        """
+        Swap the parameter set (control thread). Taking the monitor lock puts the swap
+        between two events; on_trade reads self.cfg once per event, so it never sees a
+        mix. Net-volume prints, gate timers, the book and an open position are kept.
+        cooldown_sec applies from the next entry; max_hold_sec re-arms an open position.
+        """
+        cfg.validate()
+        with self._lock:
+            old = self.cfg
+            if cfg == old: return
+            if cfg.tight_gate_window_sec != old.tight_gate_window_sec:
+                self.netwin.set_windows((cfg.tight_gate_window_sec,), self._now())
+            self.gate.tight = float(cfg.spread_tight_usd)
+            self.timers.cfg = cfg
+            self.qty_to_use = cfg.qty
+            self.cfg = cfg
+            self.cfg_reloads += 1
+            if self.position is not None and cfg.max_hold_sec != old.max_hold_sec:
+                self._cancel_deadline(); self._arm_deadline()
+            if self.position is None: self._stage_qty()  # in a position, _exit re-arms
+            changed = {f.name: getattr(cfg, f.name) for f in fields(cfg) if getattr(cfg, f.name) != getattr(old, f.name)}
+            self.log(f"[CONFIG] {reason or 'update'}: {changed}")
+
+    def set_paused(self, paused: bool, reason: str = ""):
+        """Operator pause: no new entries; an open position still exits on its own rules."""
+        with self._lock:
+            if paused != self.paused:
+                self.log(f"[CONTROL] {'paused' if paused else 'resumed'} ({reason}) position={self.position}")
+            self.paused = paused
+
+    def flatten(self, reason: str = "") -> bool:
+        """Close an open position now at the last mark. Returns False if already flat."""
+        with self._lock:
+            if self.position is None: return False
+            self.log(f"[CONTROL] flatten ({reason}) position={self.position}")
+            mark = self.gate.last_bid if self.position == "long" else self.gate.last_ask
+            self._exit(mark if mark > 0 else self.entry_price, traced=False)
+            return True
+
+    def set_exec_healthy(self, ok: bool, reason: str = ""):
+        with self._lock:
+            if ok != self.exec_healthy:
+                self.log(f"[HEALTH] executor {'healthy' if ok else 'UNHEALTHY'} ({reason}); entries {'on' if ok else 'blocked'}")
+            self.exec_healthy = ok
+
+    def force_flat(self, reason: str):
+        """The venue shows no position (closed outside the bot): drop ours without clicking."""
+        with self._lock:
+            if self.position is None: return
+            self.log(f"[RECONCILE] {self.position} -> flat ({reason})")
+            self.position = None; self.entry_price = 0.0; self.epoch += 1
+            self._cancel_deadline()
+            self.timers.set_cooldown()
+
+    def on_exec_report(self, r: ExecReport):
+        """Fill/failure feedback from AsyncExecutor (executor thread)."""
+        with self._lock:
+            if r.cancelled:
+                self.log(f"[EXEC] cancelled {r.cmd} (superseded)")
+            elif r.cmd == "qty":
+                self.log(f"[EXEC] staging qty failed: {r}")
+                self._staged_qty = None  # retype before the next entry
+            elif r.cmd in AsyncExecutor.ENTRY and not r.ok:
+                self.log(f"[EXEC] entry {r.cmd} failed: {r}")
+                if self.position == r.cmd:  # the click did not fill; we are flat
+                    self.position = None; self.entry_price = 0.0; self.epoch += 1
+                    self._cancel_deadline()
+            elif r.cmd == "settle" and not r.ok:
+                self.log(f"[EXEC] settle failed: {r}")
+            else:
+                self.log(f"[EXEC] {r}")
 
     def _enter(self, side: str, price: float):
-        print(f"[ENTER] side={side} entry={price} time={datetime.utcnow().isoformat()}Z")
-        self.trader.prepare_next_entry_qty(self.qty_to_use)
+        if self.tracer is not None: self.tracer.decision()
+        self.log(f"[ENTER] side={side} entry={price} time={datetime.utcfromtimestamp(self._now()).isoformat()}Z")
+        self._stage_qty()  # no-op while the form is armed with the same qty
         if side == "long": self.trader.fast_click_long()
         else: self.trader.fast_click_short()
         self.position = side
         self.entry_price = price
+        self.entry_qty = float(self.qty_to_use)
+        self.epoch += 1
         self.timers.set_cooldown()
+        self._arm_deadline()
+
+    def _arm_deadline(self):
+        entry_ts = self.timers.last_entry_ts
+        self._deadline = self.clock.call_at(entry_ts + self.cfg.max_hold_sec, lambda: self._on_deadline(entry_ts))
 
-    def _exit(self, price: float):
+    def _exit(self, price: float, traced: bool = True):
+        """traced=False for exits not driven by a frame (deadline timer, blind flatten, control):
+        no decision() stamp, so the executor queues the settle untraced."""
+        if traced and self.tracer is not None: self.tracer.decision()
         pnl = (price / self.entry_price - 1.0)
         if self.position == "short": pnl = -pnl
-        print(f"[EXIT] pnl={pnl*100:.3f}% hold=? at={price}")
+        self.round_trips += 1; self.realized_ret += pnl
+        self.realized_pnl += pnl * self.entry_price * self.entry_qty
+        self.log(f"[EXIT] pnl={pnl*100:.3f}% hold={self._now() - self.timers.last_entry_ts:.2f}s at={price}")
         self.trader.fast_click_settle()
+        self._stage_qty()  # re-arm during the cooldown if the qty changed
         self.position = None
         self.entry_price = 0.0
+        self.epoch += 1
+        self._cancel_deadline()
+
+    def _cancel_deadline(self):
+        if self._deadline is not None:
+            self._deadline.cancel(); self._deadline = None
 
     def _should_take_profit(self, price: float) -> bool:
-        if self.position == "long": return (price / self.entry_price - 1.0) >= TAKE_PROFIT_PCT
-        else: return (self.entry_price / price - 1.0) >= TAKE_PROFIT_PCT
+        if self.position == "long": return (price / self.entry_price - 1.0) >= self.cfg.take_profit_pct
+        else: return (self.entry_price / price - 1.0) >= self.cfg.take_profit_pct
 
     def _should_stop_loss(self, price: float) -> bool:
-        if self.position == "long": return (self.entry_price / price - 1.0) >= STOP_LOSS_PCT
-        else: return (price / self.entry_price - 1.0) >= STOP_LOSS_PCT
+        if self.position == "long": return (self.entry_price / price - 1.0) >= self.cfg.stop_loss_pct
+        else: return (price / self.entry_price - 1.0) >= self.cfg.stop_loss_pct
 
     def _max_hold_elapsed(self) -> bool:
         if self.timers.last_entry_ts <= 0: return False
-        return (time.time() - self.timers.last_entry_ts) >= MAX_HOLD_SEC
+        return (self._now() - self.timers.last_entry_ts) >= self.cfg.max_hold_sec
+
+# ===== Health Supervision =====
+class HealthSupervisor:
+    """
+    Off-hot-path executor supervision. Every HEALTH_CHECK_SEC it queues a health
+    command on the AsyncExecutor (heartbeat + read_position; orders overtake it) and:
+      - blocks entries after HEALTH_FAIL_LIMIT failed checks, until one passes
+      - reconciles StrategyMonitor.position with the page after RECONCILE_CONFIRM
+        consecutive disagreeing reads: page flat -> force_flat, page holds a position
+        the monitor does not (or the other side) -> settle it
+      - retries a failed settle SETTLE_RETRIES times, then escalates: entries stay
+        blocked until the page reads flat
+    Install it as the executor's on_report; other reports go on to the monitor.
+    """
+    def __init__(self, monitor: StrategyMonitor, executor: AsyncExecutor, interval: float = HEALTH_CHECK_SEC,
+                 log: Callable[[str], None] = metrics.log):
+        from mexcbot_latency import LatencyHistogram
+        self.monitor = monitor
+        self.executor = executor
+        self.interval = float(interval)
+        self.log = log
+        self.check_hist = LatencyHistogram()  # heartbeat + position read, ns
+        self.healthy = True
+        self.fail_streak = 0
+        self.page_position: Optional[str] = None
+        self.stats = {"checks": 0, "failures": 0, "last_check_ms": 0.0, "mismatches": 0, "reconciled": 0,
+                      "settle_failures": 0, "settle_retries": 0, "escalations": 0}
+        self.settle_attempts = 0   # retries used for the current failed settle
+        self.escalated = False
+        self._mismatch_streak = 0
+        self._epoch_at_submit = -1
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        executor.on_report = self.on_report
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None: return
+        self._thread = threading.Thread(target=self._loop, name="health", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self) -> None:
+        self._epoch_at_submit = self.monitor.epoch
+        self.executor.check_health()
+
+    # --- executor thread ---
+    def on_report(self, r: ExecReport) -> None:
+        if r.cmd == "health":
+            self._on_health(r)
+            return
+        if r.cmd == "settle" and not r.cancelled:
+            if r.ok: self._settled()
+            else: self._settle_failed()
+        self.monitor.on_exec_report(r)
+
+    def _on_health(self, r: ExecReport) -> None:
+        st = self.stats
+        dt = r.finished - r.started
+        st["checks"] += 1; st["last_check_ms"] = dt * 1e3
+        self.check_hist.record(int(dt * 1e9))
+        if not r.ok:
+            st["failures"] += 1; self.fail_streak += 1
+            if self.fail_streak >= HEALTH_FAIL_LIMIT: self._set_healthy(False, f"{self.fail_streak} failed heartbeats")
+            return
+        self.fail_streak = 0
+        self.page_position = r.detail
+        if not (self.escalated or self.settle_attempts): self._set_healthy(True, "heartbeat ok")
+        self._reconcile(r.detail)
+
+    def _reconcile(self, page: Optional[str]) -> None:
+        if page is None: return  # backend can't read the position
+        m = self.monitor
+        if m.epoch != self._epoch_at_submit or self.settle_attempts:
+            self._mismatch_streak = 0; return  # position changed under the read / settle being retried
+        if page == "flat" and self.escalated:
+            self.escalated = False; self._set_healthy(True, "page is flat again")
+        ours = m.position or "flat"
+        if page == ours:
+            self._mismatch_streak = 0; return
+        self._mismatch_streak += 1
+        if self._mismatch_streak < RECONCILE_CONFIRM: return
+        self._mismatch_streak = 0
+        self.stats["mismatches"] += 1
+        self.log(f"[RECONCILE] monitor={ours} page={page}")
+        if page == "flat":
+            m.force_flat("page shows no position")
+        else:
+            with m._lock:
+                if m.position is not None: m.force_flat(f"page holds {page}")
+                self.executor.fast_click_settle()  # no decision() behind it: untraced
+        self.stats["reconciled"] += 1
+
+    def _settled(self) -> None:
+        if not (self.settle_attempts or self.escalated): return
+        self.settle_attempts = 0; self.escalated = False
+        if self.fail_streak < HEALTH_FAIL_LIMIT: self._set_healthy(True, "settle succeeded after failure")
+
+    def _settle_failed(self) -> None:
+        self.stats["settle_failures"] += 1
+        if self.settle_attempts < SETTLE_RETRIES:
+            self.settle_attempts += 1; self.stats["settle_retries"] += 1
+            delay = SETTLE_RETRY_SEC * self.settle_attempts
+            self.log(f"[HEALTH] settle failed; retry {self.settle_attempts}/{SETTLE_RETRIES} in {delay:.1f}s")
+            self._set_healthy(False, "settle failed")
+            self.monitor.clock.call_at(self.monitor.clock.now() + delay, self._retry_settle)
+        else:
+            self.settle_attempts = 0
+            self.stats["escalations"] += 1
+            self.escalated = True
+            self.log(f"[ALERT] settle failed {SETTLE_RETRIES + 1} times; entries blocked until the page reads flat")
+            self._set_healthy(False, "settle escalated")
+
+    def _retry_settle(self) -> None:
+        # under the monitor lock, so it can't take the decision stamp of an order the WS thread is placing
+        with self.monitor._lock: self.executor.fast_click_settle()
+
+    def _set_healthy(self, ok: bool, reason: str) -> None:
+        self.healthy = ok
+        self.monitor.set_exec_healthy(ok, reason)
+
+    def report(self) -> str:
+        st = self.stats; h = self.check_hist
+        return (f"healthy={self.healthy} checks={st['checks']} failures={st['failures']} "
+                f"check p50={h.percentile(50) / 1e6:.1f}ms p99={h.percentile(99) / 1e6:.1f}ms "
+                f"mismatches={st['mismatches']} settle_failures={st['settle_failures']} "
+                f"retries={st['settle_retries']} escalations={st['escalations']}")
 
 # ===== WebSocket Consumer =====
 class WSClient(threading.Thread):
-    def __init__(self, url: str, on_trade: Callable[[float,float,bool],None], on_depth: Callable[[float,float],None]):
+    """
+    One combined-stream connection. Decoded events are routed by symbol: either every
+    symbol goes to on_trade/on_depth, or `routes` maps symbol -> (on_trade, on_depth[, on_book]).
+    With on_book, depth events are passed whole (levels for mexcbot_book) instead of (bid, ask).
+    The connection is redialed with jittered exponential backoff until stop(). While it
+    is down, silent (WS_STALE_SEC) or resyncing, the client is "blind" and tells each
+    blind listener (blind: bool, reason: str). Resync = a fresh depth snapshot for every
+    symbol, plus RESYNC_WARMUP_SEC of tape after a trade-id gap. With @trade and @aggTrade
+    both subscribed a gap counts only once both streams are past the missing ids (the
+    deduper's on_gap), so one stream lagging the other never blinds.
+    """
+    def __init__(self, url: str, on_trade: Optional[Callable[[float,float,bool],None]] = None,
+                 on_depth: Optional[Callable[[float,float],None]] = None,
+                 recorder=None, decoder_backend: str = DECODER_BACKEND,
+                 routes: Optional[Dict[str, tuple]] = None, on_book: Optional[Callable[[Any], None]] = None):
         super().__init__(daemon=True)
         self.url = url
-        self.on_trade = on_trade
-        self.on_depth = on_depth
+        self.decoder = StreamDecoder(streams_from_url(url), decoder_backend)
+        self.symbols = symbols = {ent[1] for ent in self.decoder.table.values()}
+        routes = routes or {sym: (on_trade, on_depth, on_book) for sym in symbols}
+        self.routes: Dict[str, tuple] = {sym: (tuple(r) + (None,))[:3] for sym, r in routes.items()}
+        missing = symbols - set(self.routes)
+        if missing: raise ValueError(f"no route for symbols: {sorted(missing)}")
+        for sym, dd in self.decoder.dedupers.items():
+            dd.on_gap = (lambda n, s=sym: self._on_gap(s, n))
+        self.recorder = recorder  # mexcbot_tickstore.TickRecorder (optional)
+        self.tracer = None        # mexcbot_latency.LatencyTracer (optional)
         self.ws = None
-        self._stop = False
+        self.ping_interval = WS_PING_INTERVAL_SEC; self.ping_timeout = WS_PING_TIMEOUT_SEC
+        self.backoff_base = WS_BACKOFF_BASE_SEC; self.backoff_max = WS_BACKOFF_MAX_SEC
+        self.stable_sec = WS_STABLE_SEC
+        self.stale_sec = WS_STALE_SEC; self.stale_reconnect_sec = WS_STALE_RECONNECT_SEC
+        self.resync_warmup_sec = RESYNC_WARMUP_SEC
+        self.blind = False
+        self.blind_listeners = []  # callables (blind: bool, reason: str)
+        self.connected = False
+        self.parse_errors = 0
+        self.stats = {"reconnects": 0, "last_reconnect_sec": 0.0, "max_reconnect_sec": 0.0,
+                      "gaps": 0, "gap_trades": 0, "max_gap": 0, "stale": 0}
+        # not `_stop`: threading.Thread uses that name internally (join() would break)
+        self._stop_evt = threading.Event()
+        self._blind_lock = threading.Lock()
+        self._last_msg = 0.0        # monotonic time of the last frame
+        self._opened_at = 0.0
+        self._down_since = 0.0      # monotonic time the connection was lost (0 = never up)
+        self._need_depth = set(symbols)
+        self._unblind_at = 0.0
+
     def run(self):
-        if websocket is None:
-            print("[ERR] websocket-client is not installed.")
+        try:
+            import websocket  # websocket-client; imported here so replay/sweep workers never load it
+        except Exception:
+            metrics.log("[ERR] websocket-client is not installed.")
             return
-        self.ws = websocket.WebSocketApp(
-            self.url,
-            on_message=self._on_message,
-            on_close=lambda ws,a,b: print("[WS] CLOSED"),
-            on_error=lambda ws,e: print(f"[WS] ERROR {e}"),
-            on_open=lambda ws: print(f"[WS] OPEN {self.url}")
-        )
-        self.ws.run_forever()
+        self._set_blind(True, "connecting")
+        threading.Thread(target=self._watchdog, name="ws-watchdog", daemon=True).start()
+        attempt = 0
+        while not self._stop_evt.is_set():
+            self.ws = websocket.WebSocketApp(
+                self.url,
+                on_message=self._on_message,
+                on_open=self._on_open,
+                on_close=lambda ws, code, msg: metrics.log(f"[WS] CLOSED {code or ''} {msg or ''}".rstrip()),
+                on_error=lambda ws, e: metrics.log(f"[WS] ERROR {e!r}"),
+            )
+            try:
+                self.ws.run_forever(ping_interval=self.ping_interval, ping_timeout=self.ping_timeout)
+            except Exception as e:
+                metrics.log(f"[WS] run_forever failed: {e!r}")
+            was_up = self.connected
+            self.connected = False
+            if was_up: self._down_since = time.monotonic()
+            self._set_blind(True, "disconnected")
+            if self._stop_evt.is_set(): break
+            if was_up and self._down_since - self._opened_at >= self.stable_sec: attempt = 0
+            delay = min(self.backoff_max, self.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            attempt += 1
+            metrics.log(f"[WS] reconnect #{attempt} in {delay:.2f}s")
+            self._stop_evt.wait(delay)
+
     def stop(self):
-        self._stop = True
+        self._stop_evt.set()
         try:
             self.ws and self.ws.close()
         except Exception:
             pass
+
+    # --- connection state (WS / watchdog threads) ---
+    def _on_open(self, ws):
+        now = time.monotonic()
+        self._opened_at = self._last_msg = now
+        self._need_depth = set(self.symbols)
+        self.connected = True
+        if self._down_since:
+            dt = now - self._down_since
+            st = self.stats
+            st["reconnects"] += 1; st["last_reconnect_sec"] = dt
+            if dt > st["max_reconnect_sec"]: st["max_reconnect_sec"] = dt
+            metrics.log(f"[WS] REOPEN after {dt:.2f}s {self.url}")
+        else:
+            metrics.log(f"[WS] OPEN {self.url}")
+
+    def _on_gap(self, symbol: str, missing: int):
+        st = self.stats
+        st["gaps"] += 1; st["gap_trades"] += missing
+        if missing > st["max_gap"]: st["max_gap"] = missing
+        self._unblind_at = time.monotonic() + self.resync_warmup_sec
+        self._set_blind(True, f"{symbol} trade-id gap of {missing}")
+
+    def _set_blind(self, blind: bool, reason: str):
+        with self._blind_lock:
+            if blind == self.blind: return
+            self.blind = blind
+        metrics.log(f"[WS] blind={blind} ({reason})")
+        for fn in self.blind_listeners:
+            try: fn(blind, reason)
+            except Exception: traceback.print_exc()
+
+    def _maybe_unblind(self, now: float):
+        if self.connected and not self._need_depth and now >= self._unblind_at \
+                and now - self._last_msg < self.stale_sec:
+            self._set_blind(False, "resynced")
+
+    def _watchdog(self):
+        step = max(0.05, min(self.stale_sec, 1.0) / 4)
+        while not self._stop_evt.wait(step):
+            if not self.connected: continue
+            now = time.monotonic()
+            idle = now - self._last_msg
+            if idle >= self.stale_reconnect_sec:
+                metrics.log(f"[WS] no data for {idle:.1f}s, reconnecting")
+                self._last_msg = now  # one close per stale period
+                try: self.ws and self.ws.close()
+                except Exception: pass
+            elif idle >= self.stale_sec:
+                if not self.blind: self.stats["stale"] += 1
+                self._set_blind(True, f"stale {idle:.1f}s")
+            elif self.blind:
+                self._maybe_unblind(now)
+
     def _on_message(self, ws, message: str):
+        t_recv = time.monotonic_ns()
+        recv_ns = time.time_ns()
+        self._last_msg = t_recv * 1e-9
         try:
-            obj = json.loads(message)
-            s = obj.get("stream","")
-            d = obj.get("data",{})
-            if s.endswith("@trade") or s.endswith("@aggTrade"):
-                price = float(d.get("p") or d.get("price"))
-                qty   = float(d.get("q") or d.get("quantity") or 0.0)
-                is_buy = bool(d.get("m") is False)  # maker is seller; so m=False means buyer taker => up
-                self.on_trade(price, qty, is_buy)
-            elif s.endswith("@depth5@100ms"):
-                # 両対応：b/a と bids/asks
-                bids = d.get("b") or d.get("bids") or []
-                asks = d.get("a") or d.get("asks") or []
-                if bids and asks:
-                    best_bid = float(bids[0][0]); best_ask = float(asks[0][0])
-                    self.on_depth(best_bid, best_ask)
+            ev = self.decoder.decode(message)
+            if ev is None: return
+            on_trade, on_depth, on_book = self.routes[ev.symbol]
+            if ev.kind == KIND_TRADE:
+                if self.tracer is not None:
+                    self.tracer.parsed(t_recv, recv_ns, ev.event_ms)
+                if self.recorder is not None:
+                    self.recorder.trade(ev.trade_ms, recv_ns, ev.price, ev.qty, ev.is_buy)
+                on_trade(ev.price, ev.qty, ev.is_buy)
+            else:
+                if self.tracer is not None:
+                    self.tracer.parsed(t_recv, recv_ns, ev.event_ms)
+                if self.recorder is not None:
+                    self.recorder.depth(ev.event_ms, recv_ns, ev.bid, ev.ask)
+                if on_book is not None: on_book(ev)
+                else: on_depth(ev.bid, ev.ask)
+                if self._need_depth: self._need_depth.discard(ev.symbol)
+            if self.blind: self._maybe_unblind(self._last_msg)
         except Exception as e:
-            print(f"[WS] parse error: {e}")
+            self.parse_errors += 1
+            metrics.log(f"[WS] parse error: {e!r}")
+    def dedup_stats(self) -> str:
+        return " ".join(f"{sym}: dropped={d.dropped} (partial aggTrade={d.dropped_partial}) late={d.filled}"
+                        for sym, d in self.decoder.dedupers.items())
+    def ws_stats(self) -> str:
+        st = self.stats
+        return (f"reconnects={st['reconnects']} last={st['last_reconnect_sec']:.2f}s max={st['max_reconnect_sec']:.2f}s "
+                f"gaps={st['gaps']} missed_trades={st['gap_trades']} max_gap={st['max_gap']} stale={st['stale']}")
 
 # ===== Orchestration =====
+MODES = ("live", "dry-run", "record")
+
 class AutoTradingSystem:
-    def __init__(self):
+    """
+    mode "live": browser executor (`backend`); "dry-run": DryRunTrader, no browser module is
+    imported or attached; "record": dry-run that also writes ticks to record_dir (default
+    "ticks"). mode None = "live" if USE_SELENIUM else "dry-run".
+    """
+    def __init__(self, record_dir: Optional[str] = RECORD_DIR, cfg: Optional[StrategyConfig] = None,
+                 mode: Optional[str] = None, backend: str = EXEC_BACKEND, debugger_addr: str = DEBUGGER_ADDR,
+                 metrics_port: Optional[int] = METRICS_PORT, control_port: Optional[int] = CONTROL_PORT,
+                 config_file: Optional[str] = CONFIG_FILE):
+        mode = mode or ("live" if USE_SELENIUM else "dry-run")
+        if mode not in MODES: raise ValueError(f"unknown mode: {mode}")
+        if mode == "record": record_dir = record_dir or "ticks"
         trader: BaseTrader
-        if USE_SELENIUM:
-            try: trader = MexcTrader()
+        if mode == "live":
+            try: trader = make_ui_trader(backend, debugger_addr)
             except Exception as e:
-                print(f"[WARN] Selenium起動に失敗: {e}. DryRunに切替。"); trader = DryRunTrader()
+                print(f"[WARN] {backend} executor 起動に失敗: {e}. DryRunに切替。"); trader = DryRunTrader(); mode = "dry-run"
         else:
             trader = DryRunTrader()
-        self.monitor = StrategyMonitor(trader)
-        self.ws = WSClient(BINANCE_WS_URL, self.monitor.on_trade, self.monitor.on_depth)
+        self.mode = mode; self.backend = backend
+        self.metrics_port = metrics_port
+        self.control_port = control_port; self.config_file = config_file
+        self.control = self.watcher = None
+        if USE_ASYNC_EXEC:
+            trader = AsyncExecutor(trader)
+        self.monitor = StrategyMonitor(trader, cfg)
+        self.health = None
+        if isinstance(trader, AsyncExecutor):
+            trader.on_report = self.monitor.on_exec_report
+            self.health = HealthSupervisor(self.monitor, trader)  # takes over on_report, forwards the rest
+        self.recorder = None
+        if record_dir:
+            from mexcbot_tickstore import TickRecorder
+            path = os.path.join(record_dir, f"{SYMBOL}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}")
+            self.recorder = TickRecorder(path, symbol=SYMBOL)
+            print(f"[REC] recording ticks to {path}")
+        self.ws = WSClient(BINANCE_WS_URL, self.monitor.on_trade, self.monitor.on_depth, recorder=self.recorder,
+                           on_book=self.monitor.on_book)
+        self.ws.blind_listeners.append(self.monitor.set_blind)
+        self.tracer = None
+        if LATENCY_TRACE:
+            from mexcbot_latency import LatencyTracer
+            self.tracer = LatencyTracer(LATENCY_DUMP_SEC, out=metrics.log)
+            self.ws.tracer = self.monitor.tracer = self.tracer
+            if isinstance(trader, AsyncExecutor): trader.tracer = self.tracer
+        self.metrics_server = None
+        if metrics_port:
+            metrics.register_monitor(self.monitor, SYMBOL)
+            metrics.register_ws(self.ws)
+            if isinstance(trader, AsyncExecutor): metrics.register_executor(trader)
+            if self.health is not None: metrics.register_health(self.health)
+            if self.tracer is not None: metrics.register_tracer(self.tracer)
 
     def start(self):
         try:
+            if self.metrics_port:
+                self.metrics_server = metrics.MetricsServer(self.metrics_port).start()
+                print(f"[METRICS] {self.metrics_server.url}")
+            if self.control_port or self.config_file:
+                import mexcbot_control as control
+                mons = {SYMBOL: self.monitor}
+                if self.control_port:
+                    self.control = control.ControlServer(mons, self.control_port).start()
+                    print(f"[CONTROL] {self.control.url}/state  (POST /config /pause /resume /flatten)")
+                if self.config_file:
+                    self.watcher = control.ConfigWatcher(self.config_file, mons, CONFIG_WATCH_SEC)
+                    self.watcher.poll(); self.watcher.start()  # first poll is a no-op if --config loaded the same file
+                    print(f"[CONTROL] watching {self.config_file}")
+            self.monitor.arm()
             self.ws.start()
+            if self.health is not None: self.health.start()
+            if self.tracer is not None: self.tracer.start()
         except Exception:
             traceback.print_exc()
             return
-        print(f"Symbol={SYMBOL}  thresholds: NET_ENTRY={int(NET_ENTRY)}, NET_EXIT={int(NET_EXIT)}, SPREAD_TIGHT={SPREAD_TIGHT_USD}")
-        print(f"Exit rules: TP={TAKE_PROFIT_PCT*100:.3f}%, SL={STOP_LOSS_PCT*100:.3f}%, MAX_HOLD={int(MAX_HOLD_SEC)}s")
-        print(f"Gates: tight<={TIGHT_GATE_WINDOW_SEC}s, cooldown={COOLDOWN_SEC}s, antiburst={BURST_WINDOW_SEC}")
-        print(f"Qty={self.monitor.qty_to_use}  Mode={'Selenium' if USE_SELENIUM else 'DryRun'}")
+        cfg = self.monitor.cfg
+        print(f"Symbol={SYMBOL}  thresholds: NET_ENTRY={int(cfg.net_entry)}, NET_EXIT={int(cfg.net_exit)}, SPREAD_TIGHT={cfg.spread_tight_usd}")
+        print(f"Exit rules: TP={cfg.take_profit_pct*100:.3f}%, SL={cfg.stop_loss_pct*100:.3f}%, MAX_HOLD={int(cfg.max_hold_sec)}s")
+        print(f"Gates: tight<={cfg.tight_gate_window_sec}s, cooldown={cfg.cooldown_sec}s, antiburst={cfg.burst_window_sec}")
+        print(f"Book gates: imbalance>={cfg.min_imbalance}, depth_spread<={cfg.max_depth_spread_usd} (0 = off)")
+        print(f"Qty={self.monitor.qty_to_use}  Mode={self.mode}" + (f" ({self.backend})" if self.mode == "live" else ""))
         self.monitor.start = lambda: None  # placeholder for consistency if extended
         # simple loop
         try:
@@ -311,7 +1235,62 @@ class AutoTradingSystem:
         finally:
             try: self.ws.stop()
             except Exception: pass
+            if self.watcher is not None: self.watcher.stop()
+            if self.control is not None: self.control.close()
+            if self.health is not None:
+                self.health.stop(); print(f"[HEALTH] {self.health.report()}")
+            if isinstance(self.monitor.trader, AsyncExecutor):
+                self.monitor.trader.stop()
+            if self.tracer is not None:
+                self.tracer.stop()
+            metrics.LOG.stop()  # drain queued log lines before the summary
+            if self.metrics_server is not None: self.metrics_server.close()
+            if self.recorder is not None:
+                self.recorder.close()
+                print(f"[REC] {self.recorder.rows} rows written")
+            print(f"[WS] duplicate trades {self.ws.dedup_stats()}")
+            print(f"[WS] {self.ws.ws_stats()}")
             print("[DONE] 停止しました。")
 
+def main(argv=None) -> None:
+    """
+    python mexcbot_core.py [live|dry-run|record|replay|sweep] [options]
+    Backends load only for the selected mode: selenium / the CDP client in live, numpy and
+    the tick store in replay / sweep; no mode imports the browser modules otherwise.
+    """
+    import argparse, json
+    ap = argparse.ArgumentParser(prog="mexcbot_core.py", description="MEXCbot: trade (live / dry-run / record) or research (replay / sweep)")
+    sub = ap.add_subparsers(dest="mode")
+    for name, help in (("live", "trade through the browser executor"), ("dry-run", "full pipeline, orders are only printed"),
+                       ("record", "dry-run and record ticks for replay")):
+        p = sub.add_parser(name, help=help)
+        p.add_argument("--config", help="JSON {StrategyConfig field: value}")
+        p.add_argument("--record-dir", default="ticks" if name == "record" else RECORD_DIR)
+        p.add_argument("--watch", action="store_true", help="apply edits to --config while running")
+        p.add_argument("--metrics-port", type=int, default=METRICS_PORT or 0, help="0 = off")
+        p.add_argument("--control-port", type=int, default=CONTROL_PORT or 0, help="0 = off")
+        if name == "live":
+            p.add_argument("--backend", choices=("selenium", "cdp"), default=EXEC_BACKEND)
+            p.add_argument("--debugger-addr", default=DEBUGGER_ADDR)
+    sub.add_parser("replay", add_help=False, help="backtest recorded / synthetic ticks (mexcbot_replay; -h for its options)")
+    sub.add_parser("sweep", add_help=False, help="parallel StrategyConfig sweep (mexcbot_sweep; -h for its options)")
+    args, rest = ap.parse_known_args(argv)
+    if args.mode in ("replay", "sweep"):
+        mod = __import__(f"mexcbot_{args.mode}")
+        mod.main(rest, prog=f"mexcbot_core.py {args.mode}"); return
+    if rest: ap.error(f"unrecognized arguments: {' '.join(rest)}")
+    if args.mode is None:
+        AutoTradingSystem().start(); return
+    cfg = None
+    if args.config:
+        try:
+            with open(args.config, encoding="utf-8") as f: cfg = StrategyConfig.from_dict(json.load(f))
+        except (KeyError, ValueError, TypeError) as e:
+            ap.error(f"--config {args.config}: {e.args[0] if e.args else e}")
+    if args.watch and not args.config: ap.error("--watch needs --config")
+    AutoTradingSystem(args.record_dir, cfg, args.mode, getattr(args, "backend", EXEC_BACKEND),
+                      getattr(args, "debugger_addr", DEBUGGER_ADDR), args.metrics_port or None,
+                      args.control_port or None, args.config if args.watch else None).start()
+
 if __name__ == "__main__":
-    AutoTradingSystem().start()
+    main()
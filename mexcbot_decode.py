@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mexcbot_decode.py
+Binance combined-stream frame decoding for WSClient.
+
+- JSON backend: orjson when installed, stdlib json otherwise (or forced by name)
+- dispatch by exact stream name through a table built once from the subscription,
+  instead of endswith() checks per frame
+- only the fields the strategy uses are converted (depth: level 0; the raw levels
+  are passed on for mexcbot_book.TopBook)
+- events are __slots__ objects owned by the decoder and reused for every frame;
+  consumers must copy what they keep before the next decode()
+"""
+from __future__ import annotations
+import json
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+KIND_TRADE, KIND_DEPTH = 1, 2
+BINANCE_WS_BASE = "wss://stream.binance.com:9443/stream?streams="
+TRADE_STREAM_KINDS = {"trade": ("trade",), "aggTrade": ("aggTrade",), "merge": ("trade", "aggTrade")}
+DEPTH_STREAM = "depth5@100ms"
+
+
+def symbol_streams(symbol: str, trade_source: str = "merge", depth: str = DEPTH_STREAM) -> Tuple[str, ...]:
+    """Streams one symbol needs: its trade source(s) plus top-of-book depth."""
+    return tuple(f"{symbol}@{k}" for k in TRADE_STREAM_KINDS[trade_source]) + (f"{symbol}@{depth}",)
+
+
+def build_stream_url(streams: Iterable[str], base: str = BINANCE_WS_BASE) -> str:
+    return base + "/".join(streams)
+
+
+class TradeDeduper:
+    """
+    Emits each fill exactly once when @trade and @aggTrade are both subscribed.
+    Each stream is in order on its own but either may lead, so there are three marks:
+    last_id (highest id emitted) and one high-water mark per stream.
+      - an id / aggTrade range above last_id is emitted; ids it skips become a hole
+        that the other stream may still fill (those fills are emitted late)
+      - an id / range inside a hole is emitted and fills it; anything else at or
+        below last_id is a duplicate. An aggTrade that only partially overlaps is
+        dropped too: its qty can't be split, and the rest of its range still comes
+        through @trade
+      - a hole is a gap (missed fills, on_gap) only once every subscribed stream is
+        past it, or once the leading stream is max_lag ids ahead of it (other stream
+        silent)
+    With a single stream subscribed, a skipped id is a gap immediately.
+    """
+    def __init__(self, streams: Iterable[str] = ("trade", "aggTrade"), max_lag: int = 1000):
+        self.streams = set(streams)  # StreamDecoder.add_stream registers the symbol's trade streams
+        self.max_lag = int(max_lag)
+        self.last_id = -1
+        self.last_trade = -1; self.last_agg = -1  # per-stream high-water marks
+        self.holes: list = []     # [lo, hi] ids skipped by the leading stream, ascending
+        self.dropped = 0          # duplicates discarded
+        self.dropped_partial = 0  # of which partially-overlapping aggTrades
+        self.filled = 0           # ids emitted late into a hole
+        self.gaps = 0             # confirmed gaps
+        self.gap_trades = 0       # trade ids missed in total
+        self.on_gap: Optional[Callable[[int], None]] = None  # called with the number of missed ids
+    def accept_trade(self, trade_id: int) -> bool:
+        self.last_trade = trade_id
+        return self._accept(trade_id, trade_id)
+    def accept_agg(self, first_id: int, last_id: int) -> bool:
+        self.last_agg = last_id
+        return self._accept(first_id, last_id)
+    def _accept(self, lo: int, hi: int) -> bool:
+        last = self.last_id
+        if lo == last + 1 and not self.holes:  # the steady state: next id from the leading stream
+            self.last_id = hi; return True
+        if lo > last:
+            if lo > last + 1 and last >= 0: self.holes.append([last + 1, lo - 1])
+            self.last_id = hi; ok = True
+        elif hi <= last and self._fill(lo, hi):
+            self.filled += hi - lo + 1; ok = True
+        else:
+            self.dropped += 1
+            if hi > last: self.dropped_partial += 1
+            ok = False
+        if self.holes: self._confirm()
+        return ok
+    def _fill(self, lo: int, hi: int) -> bool:
+        holes = self.holes
+        for i, h in enumerate(holes):
+            if h[0] <= lo and hi <= h[1]:
+                if lo > h[0] and hi < h[1]: holes.insert(i + 1, [hi + 1, h[1]]); h[1] = lo - 1
+                elif lo > h[0]: h[1] = lo - 1
+                elif hi < h[1]: h[0] = hi + 1
+                else: del holes[i]
+                return True
+        return False
+    def _confirm(self) -> None:
+        s = self.streams
+        if "trade" in s and "aggTrade" in s: floor = min(self.last_trade, self.last_agg)
+        else: floor = self.last_trade if "trade" in s else self.last_agg
+        floor = max(floor, self.last_id - self.max_lag)
+        holes = self.holes
+        while holes and holes[0][1] <= floor:
+            lo, hi = holes.pop(0); n = hi - lo + 1
+            self.gaps += 1; self.gap_trades += n
+            if self.on_gap is not None: self.on_gap(n)
+
+
+class TradeEvent:
+    __slots__ = ("symbol", "price", "qty", "is_buy", "first_id", "last_id", "trade_ms", "event_ms")
+    kind = KIND_TRADE
+    def __init__(self):
+        self.symbol = ""; self.price = 0.0; self.qty = 0.0; self.is_buy = False
+        self.first_id = 0; self.last_id = 0; self.trade_ms = 0; self.event_ms = 0
+
+
+class DepthEvent:
+    __slots__ = ("symbol", "bid", "ask", "bid_qty", "ask_qty", "bids", "asks", "update_id", "event_ms")
+    kind = KIND_DEPTH
+    def __init__(self):
+        self.symbol = ""; self.bid = 0.0; self.ask = 0.0; self.bid_qty = 0.0; self.ask_qty = 0.0
+        self.bids = (); self.asks = ()  # raw [[price, qty], ...] levels as decoded (strings)
+        self.update_id = 0; self.event_ms = 0
+
+
+def loads_for(backend: str = "auto") -> Tuple[str, Callable[[Union[str, bytes]], dict]]:
+    orjson = None
+    if backend in ("auto", "orjson"):
+        try: import orjson  # imported on first decoder only; replay/sweep never build one
+        except Exception: pass
+    if backend == "auto":
+        backend = "orjson" if orjson is not None else "json"
+    if backend == "orjson":
+        if orjson is None: raise RuntimeError("orjson is not installed")
+        return backend, orjson.loads
+    if backend == "json":
+        return backend, json.loads
+    raise ValueError(f"unknown decoder backend: {backend}")
+
+
+def streams_from_url(url: str) -> Tuple[str, ...]:
+    """'...stream?streams=a@trade/b@depth5@100ms' -> ('a@trade', 'b@depth5@100ms')"""
+    _, _, q = url.partition("streams=")
+    return tuple(s for s in q.split("&")[0].split("/") if s)
+
+
+class StreamDecoder:
+    """
+    decode(frame) -> TradeEvent / DepthEvent (reused objects) or None.
+    With `dedup`, each symbol gets a TradeDeduper (trade ids are per symbol) that is
+    consulted before any float conversion, so duplicate @trade/@aggTrade frames cost
+    only the JSON parse.
+    """
+    def __init__(self, streams: Iterable[str], backend: str = "auto", dedup: bool = True):
+        self.backend, self._loads = loads_for(backend)
+        self.dedup = dedup
+        self.dedupers: Dict[str, TradeDeduper] = {}
+        self.trade = TradeEvent()
+        self.depth = DepthEvent()
+        self.unknown = 0
+        self.table: Dict[str, list] = {}  # stream -> [handler, symbol, TradeDeduper or None, frames]
+        for s in streams:
+            self.add_stream(s)
+
+    def add_stream(self, stream: str) -> None:
+        symbol, _, kind = stream.partition("@")
+        if kind == "trade": h = self._on_trade
+        elif kind == "aggTrade": h = self._on_agg
+        elif kind[:5] == "depth" and kind[5:6].isdigit(): h = self._on_depth  # partial book only; no diff depth
+        else: raise ValueError(f"unsupported stream: {stream}")
+        dd = None
+        if self.dedup:
+            dd = self.dedupers.get(symbol)
+            if dd is None: dd = self.dedupers[symbol] = TradeDeduper(())
+            if kind in TRADE_STREAM_KINDS["merge"]: dd.streams.add(kind)
+        self.table[stream] = [h, symbol, dd, 0]
+
+    def decode(self, frame: Union[str, bytes]):
+        obj = self._loads(frame)
+        ent = self.table.get(obj.get("stream"))
+        if ent is None:
+            self.unknown += 1
+            return None
+        ent[3] += 1
+        return ent[0](ent[1], ent[2], obj["data"])
+
+    def _on_trade(self, symbol: str, dedup, d: dict):
+        tid = d["t"]
+        if dedup is not None and not dedup.accept_trade(tid): return None
+        ev = self.trade
+        ev.symbol = symbol; ev.first_id = ev.last_id = tid
+        ev.price = float(d["p"]); ev.qty = float(d["q"])
+        ev.is_buy = d["m"] is False  # maker is seller; so m=False means buyer taker => up
+        ev.trade_ms = d["T"]; ev.event_ms = d["E"]
+        return ev
+
+    def _on_agg(self, symbol: str, dedup, d: dict):
+        f = d["f"]; l = d["l"]
+        if dedup is not None and not dedup.accept_agg(f, l): return None
+        ev = self.trade
+        ev.symbol = symbol; ev.first_id = f; ev.last_id = l
+        ev.price = float(d["p"]); ev.qty = float(d["q"])
+        ev.is_buy = d["m"] is False
+        ev.trade_ms = d["T"]; ev.event_ms = d["E"]
+        return ev
+
+    def _on_depth(self, symbol: str, dedup, d: dict):
+        # partial book (@depthN) uses bids/asks, futures payloads use b/a
+        bids = d.get("bids") or d.get("b"); asks = d.get("asks") or d.get("a")
+        if not bids or not asks: return None
+        ev = self.depth
+        ev.symbol = symbol; ev.bids = bids; ev.asks = asks
+        b0 = bids[0]; a0 = asks[0]
+        ev.bid = float(b0[0]); ev.bid_qty = float(b0[1])
+        ev.ask = float(a0[0]); ev.ask_qty = float(a0[1])
+        ev.update_id = d.get("lastUpdateId") or d.get("u") or 0
+        ev.event_ms = d.get("E") or 0
+        return ev
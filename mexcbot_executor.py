@@ -8,10 +8,24 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
+try:
+    from mexcbot_metrics import log  # queued: keeps console I/O off the click path
+except Exception:
+    log = print
+
 
 DEBUGGER_ADDR = "127.0.0.1:9222"
 # COMPLETE_MESSAGE = 'の注文が全て約定しました'
 COMPLETE_MESSAGE = 'order filled completely'
+# クイック決済ボタン: 建玉があるときだけ表示される (long 建玉 -> FastClose_short 側の Close Long)
+FAST_CLOSE_SELECTORS = {
+    'long':  'div[class^="FastClose_short"] button[class^="FastClose_closeBtn"]',
+    'short': 'div[class^="FastClose_long"] button[class^="FastClose_closeBtn"]',
+}
+QTY_SELECTORS = {
+    1: '#mexc_contract_v_open_position div.input-wrapper > div.extend-wrapper > input.ant-input',  # 右側のQuantity
+    2: 'input[id^=rc_select_]',                                                                     # 下部のQuantity
+}
 
 class SeleniumBot():
     def __init__(self, debugger_addr: str = DEBUGGER_ADDR):
@@ -20,16 +34,14 @@ class SeleniumBot():
         self.wait = WebDriverWait(self.driver, 10)
         self.clickable = EC.element_to_be_clickable
         self.visibility = EC.visibility_of_element_located
+        self.last_confirm_ns = 0  # time.monotonic_ns() when the last fill toast was confirmed
 
     def set_qty(self, qty: float, mode: int = 1) -> bool:
         '''
         mode:1 右側のQuantity 
         mode:2 下部のQuantity 
         '''
-        if mode == 1:
-            selector = '#mexc_contract_v_open_position div.input-wrapper > div.extend-wrapper > input.ant-input'
-        else:
-            selector = 'input[id^=rc_select_]'
+        selector = QTY_SELECTORS[1 if mode == 1 else 2]
         try:
             element = self.wait.until(self.clickable((By.CSS_SELECTOR, selector)))
             element.send_keys(Keys.CONTROL + "a")  # 全選択
@@ -43,15 +55,20 @@ class SeleniumBot():
             if element.get_attribute('value') == str(qty):
                 return True
             else:
-                print(f'入力値が一致しません')
+                log(f'入力値が一致しません')
                 return False
         except TimeoutException as e:
-            print(f'[TimeoutException] {str(e)}')
+            log(f'[TimeoutException] {str(e)}')
             return False
         except Exception as e:
-            print(f'[Exception] {str(e)}')
+            log(f'[Exception] {str(e)}')
             return False
 
+    def get_qty(self, mode: int = 1):
+        '''数量入力欄の現在値（見つからなければ None）。待たずに読むだけ'''
+        elements = self.driver.find_elements(By.CSS_SELECTOR, QTY_SELECTORS[1 if mode == 1 else 2])
+        return elements[0].get_attribute('value') if elements else None
+
     def open_long(self) -> bool:
         try:
             # Open Long ボタンをクリックする
@@ -62,16 +79,18 @@ class SeleniumBot():
             selector = 'div.ant-notification-notice-message'
             element = self.wait.until(self.visibility((By.CSS_SELECTOR, selector)))
             if COMPLETE_MESSAGE in element.text.strip():
-                print('注文が全て約定しました')
+                self.last_confirm_ns = time.monotonic_ns()
+                log('注文が全て約定しました')
                 return True
             else:
-                print(f'成功トーストを検知できませんでした')
+                log(f'成功トーストを検知できませんでした')
                 return False
         except TimeoutException as e:
-            print(f'[TimeoutException] {str(e)}')
+            log(f'[TimeoutException] {str(e)}')
             return False
         except Exception as e:
-            print(f'[Exception] {str(e)}')
+            log(f'[Exception] {str(e)}')
+            return False
 
     def open_short(self) -> bool:
         try:
@@ -83,54 +102,57 @@ class SeleniumBot():
             selector = 'div.ant-notification-notice-message'
             element = self.wait.until(self.visibility((By.CSS_SELECTOR, selector)))
             if COMPLETE_MESSAGE in element.text.strip():
-                print('注文が全て約定しました')
+                self.last_confirm_ns = time.monotonic_ns()
+                log('注文が全て約定しました')
                 return True
             else:
-                print(f'成功トーストを検知できませんでした')
+                log(f'成功トーストを検知できませんでした')
                 return False
         except TimeoutException as e:
-            print(f'[TimeoutException] {str(e)}')
+            log(f'[TimeoutException] {str(e)}')
             return False
         except Exception as e:
-            print(f'[Exception] {str(e)}')
+            log(f'[Exception] {str(e)}')
             return False
 
     def close_long(self) -> bool:
         try:
             # Close Long ボタンをクリックする
-            selector = 'div[class^="FastClose_short"] button[class^="FastClose_closeBtn"]'
+            selector = FAST_CLOSE_SELECTORS['long']
             element = self.wait.until(self.clickable((By.CSS_SELECTOR, selector)))
             element.click()
             if COMPLETE_MESSAGE in element.text.strip():
-                print('注文が全て約定しました')
+                self.last_confirm_ns = time.monotonic_ns()
+                log('注文が全て約定しました')
                 return True
             else:
-                print(f'成功トーストを検知できませんでした')
+                log(f'成功トーストを検知できませんでした')
                 return False
         except TimeoutException as e:
-            print(f'[TimeoutException] {str(e)}')
+            log(f'[TimeoutException] {str(e)}')
             return False
         except Exception as e:
-            print(f'[Exception] {str(e)}')
+            log(f'[Exception] {str(e)}')
             return False
 
     def close_short(self) -> bool:
         try:
             # Close Long ボタンをクリックする
-            selector = 'div[class^="FastClose_long"] button[class^="FastClose_closeBtn"]'
+            selector = FAST_CLOSE_SELECTORS['short']
             element = self.wait.until(self.clickable((By.CSS_SELECTOR, selector)))
             element.click()
             if COMPLETE_MESSAGE in element.text.strip():
-                print('注文が全て約定しました')
+                self.last_confirm_ns = time.monotonic_ns()
+                log('注文が全て約定しました')
                 return True
             else:
-                print(f'成功トーストを検知できませんでした')
+                log(f'成功トーストを検知できませんでした')
                 return False
         except TimeoutException as e:
-            print(f'[TimeoutException] {str(e)}')
+            log(f'[TimeoutException] {str(e)}')
             return False
         except Exception as e:
-            print(f'[Exception] {str(e)}')
+            log(f'[Exception] {str(e)}')
             return False
 
     def close_all(self) -> bool:
@@ -149,40 +171,45 @@ class SeleniumBot():
             selector = 'div.ant-notification-notice-message'
             element = self.wait.until(self.visibility((By.CSS_SELECTOR, selector)))
             if complete_message in element.text.strip():
-                print('注文が全て約定しました')
+                self.last_confirm_ns = time.monotonic_ns()
+                log('注文が全て約定しました')
                 return True
             else:
-                print(f'成功トーストを検知できませんでした')
+                log(f'成功トーストを検知できませんでした')
                 return False
         except TimeoutException as e:
-            print(f'[TimeoutException] {str(e)}')
+            log(f'[TimeoutException] {str(e)}')
             return False
         except Exception as e:
-            print(f'[Exception] {str(e)}')
+            log(f'[Exception] {str(e)}')
             return False
 
-    def heartbeat(self) -> bool:
+    def heartbeat(self, timeout=None) -> bool:
+        '''timeout: 各待機の上限秒 (None = self.wait の 10 秒)。注文と同じスレッドで動くので監視側は短くする'''
+        wait = self.wait if timeout is None else WebDriverWait(self.driver, timeout)
         try:
             # Openタブをクリックする
             selector = 'span[data-testid="contract-trade-order-form-tab-open"]'
-            element = self.wait.until(self.clickable((By.CSS_SELECTOR, selector)))
+            element = wait.until(self.clickable((By.CSS_SELECTOR, selector)))
             element.click()
             # Open Long ボタンのクリック可否確認
             selector = 'button[data-testid="contract-trade-open-long-btn"]'
-            element = self.wait.until(self.clickable((By.CSS_SELECTOR, selector)))
+            element = wait.until(self.clickable((By.CSS_SELECTOR, selector)))
             # Open Short ボタンをクリック可否確認
             selector = 'button[data-testid="contract-trade-open-short-btn"]'
-            element = self.wait.until(self.clickable((By.CSS_SELECTOR, selector)))
+            element = wait.until(self.clickable((By.CSS_SELECTOR, selector)))
             return True
         except TimeoutException as e:
-            print(f'[TimeoutException] {str(e)}')
+            log(f'[TimeoutException] {str(e)}')
             return False
         except Exception as e:
-            print(f'[Exception] {str(e)}')
+            log(f'[Exception] {str(e)}')
             return False
 
-    def is_position_open(self, side:str) -> bool:
-        pass
+    def is_position_open(self, side: str) -> bool:
+        '''side の建玉があるか: クイック決済ボタンが表示されているかで判定（待たずに読むだけ）'''
+        elements = self.driver.find_elements(By.CSS_SELECTOR, FAST_CLOSE_SELECTORS[side])
+        return bool(elements) and elements[0].is_displayed()
 
 if __name__ == '__main__':
     bot =SeleniumBot()
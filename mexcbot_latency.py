@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mexcbot_latency.py
+End-to-end latency tracing from exchange timestamp to confirmed fill.
+
+Stages (all time.monotonic_ns except exch->recv, which compares the exchange's
+wall-clock E/T field with our wall clock and therefore includes clock skew):
+  exch_to_recv       Binance event time -> frame received
+  recv_to_parse      frame received -> fields decoded
+  parse_to_decision  decoded -> strategy decided to enter/exit
+  decision_to_call   decided -> BaseTrader call starts (executor queueing)
+  call_to_fill       BaseTrader call -> fill toast confirmed
+  recv_to_fill       frame received -> fill toast confirmed
+
+The hot path only reads the clock and bumps a counter in a log-linear
+(HDR-style) histogram; percentiles are computed when dumping.
+"""
+from __future__ import annotations
+import threading, time
+from typing import Callable, Dict, List, Optional, Tuple
+
+STAGES = ("exch_to_recv", "recv_to_parse", "parse_to_decision", "decision_to_call", "call_to_fill", "recv_to_fill")
+
+
+class LatencyHistogram:
+    """
+    Log-linear buckets: values below 2**sub_bits ns are exact, above that each
+    power of two is split into 2**(sub_bits-1) buckets (~1.6% error with sub_bits=7).
+    """
+    def __init__(self, sub_bits: int = 7, max_bits: int = 40):
+        self.k = sub_bits
+        self.S = 1 << sub_bits
+        self.half = self.S >> 1
+        self.max_v = (1 << max_bits) - 1
+        self.counts: List[int] = [0] * (self.S + (max_bits - sub_bits + 1) * self.half)
+        self.n = 0; self.max = 0; self.total = 0
+
+    def record(self, v: int) -> None:
+        if v < 0: v = 0
+        elif v > self.max_v: v = self.max_v
+        if v < self.S:
+            idx = v
+        else:
+            e = v.bit_length() - self.k
+            idx = self.S + (e - 1) * self.half + ((v >> e) - self.half)
+        self.counts[idx] += 1
+        self.n += 1; self.total += v
+        if v > self.max: self.max = v
+
+    def _upper(self, idx: int) -> int:
+        if idx < self.S: return idx
+        e, m = divmod(idx - self.S, self.half)
+        e += 1
+        return ((m + self.half + 1) << e) - 1
+
+    def percentile(self, p: float) -> int:
+        """Upper bound (ns) of the bucket holding the p-th percentile."""
+        n = self.n
+        if n == 0: return 0
+        rank = max(1, int(p / 100.0 * n + 0.5))
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            if c:
+                seen += c
+                if seen >= rank: return min(self._upper(idx), self.max)
+        return self.max
+
+    def reset(self) -> None:
+        self.counts = [0] * len(self.counts); self.n = 0; self.max = 0; self.total = 0
+
+
+class LatencyTracer:
+    """
+    Per-stage histograms plus the stamps of the event currently being handled.
+    Stamps are plain attributes written by the WS thread (one event at a time);
+    the executor captures them when an order is enqueued.
+    Only the WS thread, while handling the frame that triggered the order, may call
+    parsed() and decision() (WSClient, StrategyMonitor._enter / frame-driven _exit).
+    Timer, watchdog, health-supervisor and control threads must not call decision():
+    the stamps there belong to some earlier frame. The decision stamp is one-shot:
+    the executor takes it (take_decision) for the order it queues, so an order with no
+    decision() since the previous one - every non-frame exit or settle - is untraced.
+    """
+    def __init__(self, dump_every_sec: float = 60.0, out: Callable[[str], None] = print):
+        self.h: Dict[str, LatencyHistogram] = {s: LatencyHistogram() for s in STAGES}
+        self.dump_every = float(dump_every_sec)
+        self.out = out
+        self.t_recv = 0      # monotonic ns of the current frame
+        self.t_parse = 0
+        self.t_decision = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- hot path ---
+    def parsed(self, t_recv: int, recv_wall_ns: int, exch_ms: int) -> None:
+        now = time.monotonic_ns()
+        self.t_recv = t_recv; self.t_parse = now
+        self.h["recv_to_parse"].record(now - t_recv)
+        if exch_ms:
+            self.h["exch_to_recv"].record(recv_wall_ns - exch_ms * 1_000_000)
+
+    def decision(self) -> None:
+        now = time.monotonic_ns()
+        self.t_decision = now
+        if self.t_parse: self.h["parse_to_decision"].record(now - self.t_parse)
+
+    def take_decision(self) -> Optional[Tuple[int, int]]:
+        """(t_recv, t_decision) for the order being queued, or None; clears the decision stamp."""
+        t = self.t_decision
+        if not t: return None
+        self.t_decision = 0
+        return self.t_recv, t
+
+    def executed(self, t_recv: int, t_decision: int, t_call: int, t_fill: int) -> None:
+        """Called by the executor after a BaseTrader call that confirmed a fill."""
+        if t_decision: self.h["decision_to_call"].record(t_call - t_decision)
+        if t_fill:
+            self.h["call_to_fill"].record(t_fill - t_call)
+            if t_recv: self.h["recv_to_fill"].record(t_fill - t_recv)
+
+    # --- reporting ---
+    def report(self) -> List[str]:
+        lines = []
+        for s in STAGES:
+            h = self.h[s]
+            if not h.n: continue
+            lines.append(f"[LAT] {s:<17} n={h.n:<8d} p50={h.percentile(50) / 1e3:10.1f}us "
+                         f"p99={h.percentile(99) / 1e3:10.1f}us p999={h.percentile(99.9) / 1e3:10.1f}us "
+                         f"max={h.max / 1e3:10.1f}us")
+        return lines
+
+    def dump(self) -> None:
+        for line in self.report(): self.out(line)
+
+    def start(self) -> None:
+        if self.dump_every <= 0 or self._thread is not None: return
+        def loop():
+            while not self._stop.wait(self.dump_every): self.dump()
+        self._thread = threading.Thread(target=loop, name="latency-dump", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.dump()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mexcbot_metrics.py
+Metrics and logging that stay off the latency-critical threads.
+
+- Registry: metric families rendered in Prometheus text format. Bot state is
+  registered as a callable that is only evaluated at scrape time (net volume,
+  spread, gates, position, PnL, executor/WS/health counters), so the hot path
+  pays nothing between scrapes. LatencyHistograms are exported as summaries.
+- MetricsServer: GET /metrics on 127.0.0.1 for Prometheus to scrape.
+- LogQueue / log(): non-blocking log lines; a background writer drains them to
+  stdout, so the WS / executor threads never wait on the console.
+"""
+from __future__ import annotations
+import atexit, sys, threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def _fmt_labels(labels: Dict[str, str], extra: str = "") -> str:
+    parts = [f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+             for k, v in labels.items()]
+    if extra: parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v) -> str:
+    if isinstance(v, bool): return "1" if v else "0"
+    if v is None: return "NaN"
+    return repr(float(v))
+
+
+class Registry:
+    def __init__(self):
+        self._fam: Dict[str, list] = {}  # name -> [type, help, [(labels, source)]]
+        self._lock = threading.Lock()
+
+    def _add(self, kind: str, name: str, help: str, source, labels: Dict[str, str]) -> None:
+        with self._lock:
+            fam = self._fam.setdefault(name, [kind, help, []])
+            if fam[0] != kind: raise ValueError(f"{name} already registered as {fam[0]}")
+            fam[2].append((labels, source))
+
+    def counter(self, name: str, help: str, fn: Callable[[], float], **labels) -> None:
+        """Registers `fn`, read at scrape time (it must be cheap and must not block)."""
+        self._add("counter", name, help, fn, labels)
+
+    def gauge(self, name: str, help: str, fn: Callable[[], float], **labels) -> None:
+        self._add("gauge", name, help, fn, labels)
+
+    def summary(self, name: str, help: str, hist, scale: float = 1e-9, **labels) -> None:
+        """Export a mexcbot_latency.LatencyHistogram (ns) as quantiles, scaled to seconds by default."""
+        self._add("summary", name, help, (hist, scale), labels)
+
+    def clear(self) -> None:
+        with self._lock: self._fam.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            fams = [(n, f[0], f[1], list(f[2])) for n, f in self._fam.items()]
+        out: List[str] = []
+        for name, kind, help, samples in fams:
+            if help: out.append(f"# HELP {name} {help}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, src in samples:
+                try:
+                    if kind == "summary":
+                        h, scale = src
+                        for q in QUANTILES:
+                            ql = _fmt_labels(labels, 'quantile="%s"' % q)
+                            out.append(f"{name}{ql} {_fmt_value(h.percentile(q * 100) * scale)}")
+                        out.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(h.total * scale)}")
+                        out.append(f"{name}_count{_fmt_labels(labels)} {h.n}")
+                    else:
+                        out.append(f"{name}{_fmt_labels(labels)} {_fmt_value(src())}")
+                except Exception:
+                    continue  # a sample that cannot be read right now is skipped, not fatal
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class MetricsServer:
+    """Prometheus text endpoint (GET /metrics) on a background thread."""
+    def __init__(self, port: int, registry: Registry = REGISTRY, host: str = "127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # only when serving
+        reg = registry
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404); return
+                body = reg.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers(); self.wfile.write(body)
+            def log_message(self, *a): pass
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def start(self) -> "MetricsServer":
+        threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        self.httpd.shutdown(); self.httpd.server_close()
+
+
+# ===== Non-blocking log =====
+class LogQueue:
+    """
+    log(msg) appends to a deque (atomic, no lock) and returns; a writer thread
+    started on first use drains it every flush_sec. Beyond maxlen pending lines,
+    new lines are dropped and counted instead of blocking the caller.
+    """
+    def __init__(self, write: Optional[Callable[[str], None]] = None, flush_sec: float = 0.05, maxlen: int = 100_000):
+        self._write = write
+        self.flush_sec = float(flush_sec)
+        self.maxlen = int(maxlen)
+        self.dropped = 0
+        self.lines = 0
+        self._q: deque = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def log(self, msg: str) -> None:
+        if len(self._q) >= self.maxlen:
+            self.dropped += 1; return
+        self._q.append(msg)
+        if self._thread is None: self._start()
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is not None: return
+            self._thread = threading.Thread(target=self._loop, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.flush_sec):
+            self.flush()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            q = self._q; lines = []
+            while q: lines.append(q.popleft())
+            if not lines: return
+            self.lines += len(lines)
+            text = "\n".join(lines) + "\n"
+            if self._write is not None:
+                self._write(text)
+            else:
+                sys.stdout.write(text); sys.stdout.flush()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.flush()
+
+
+LOG = LogQueue()
+log = LOG.log
+atexit.register(LOG.flush)
+
+
+# ===== Registration helpers (duck-typed; this module does not import mexcbot_core) =====
+def register_monitor(m, symbol: str, registry: Registry = REGISTRY) -> None:
+    """StrategyMonitor state, read under its lock at scrape time."""
+    r = registry; L = {"symbol": symbol}
+    def locked(fn):
+        def read():
+            with m._lock: return fn()
+        return read
+    r.gauge("mexcbot_net_volume", "Rolling net taker volume over tight_gate_window_sec (as of the last trade)",
+            locked(lambda: m.netwin.net()), **L)
+    r.gauge("mexcbot_spread", "Best ask minus best bid",
+            lambda: (m.gate.last_ask - m.gate.last_bid) if m.gate.last_bid > 0 and m.gate.last_ask > 0 else None, **L)
+    r.gauge("mexcbot_gate_tight", "1 while the spread gate is open", lambda: m.gate.is_tight(), **L)
+    r.gauge("mexcbot_gate_timers", "1 while cooldown/antiburst timers allow an entry", lambda: m.timers.can_enter(), **L)
+    bk = m.book
+    r.gauge("mexcbot_book_imbalance", "L1 queue imbalance (bid_qty - ask_qty) / (bid_qty + ask_qty)", lambda: bk.imbalance, **L)
+    r.gauge("mexcbot_book_depth_imbalance", "Queue imbalance over the top-N levels", lambda: bk.depth_imbalance, **L)
+    r.gauge("mexcbot_book_microprice", "Size-weighted mid of the best levels", lambda: bk.microprice, **L)
+    r.gauge("mexcbot_book_depth_spread", "Qty-weighted avg ask - avg bid over the top-N levels", lambda: bk.depth_spread, **L)
+    r.gauge("mexcbot_book_synced", "1 while the top-N book is usable", lambda: bk.synced, **L)
+    r.counter("mexcbot_book_out_of_order_total", "Depth updates dropped for a non-increasing update id",
+              lambda: bk.out_of_order, **L)
+    r.gauge("mexcbot_position", "1 long, -1 short, 0 flat", lambda: {"long": 1, "short": -1}.get(m.position, 0), **L)
+    r.gauge("mexcbot_blind", "1 while market data is not trusted (no entries)", lambda: m.blind, **L)
+    r.gauge("mexcbot_exec_healthy", "0 while the executor supervisor blocks entries", lambda: m.exec_healthy, **L)
+    r.gauge("mexcbot_paused", "1 while entries are paused from mexcbot_control", lambda: m.paused, **L)
+    r.counter("mexcbot_config_reloads_total", "StrategyConfig swaps applied at runtime", lambda: m.cfg_reloads, **L)
+    r.counter("mexcbot_round_trips_total", "Closed round trips", lambda: m.round_trips, **L)
+    r.gauge("mexcbot_realized_pnl", "Realized PnL in quote currency at decision prices", lambda: m.realized_pnl, **L)
+    r.gauge("mexcbot_realized_return", "Sum of per-trade returns at decision prices", lambda: m.realized_ret, **L)
+
+
+def register_ws(client, registry: Registry = REGISTRY) -> None:
+    r = registry; L = {"symbols": ",".join(sorted(client.symbols))}
+    for stream, ent in client.decoder.table.items():
+        r.counter("mexcbot_ws_frames_total", "Frames received per stream (rate() gives msgs/sec)",
+                  lambda e=ent: e[3], stream=stream)  # StreamDecoder counts in its dispatch entry
+    for sym, dd in client.decoder.dedupers.items():
+        r.counter("mexcbot_ws_duplicate_trades_total", "Trades dropped as @trade/@aggTrade duplicates",
+                  lambda d=dd: d.dropped, symbol=sym)
+    r.counter("mexcbot_ws_unknown_frames_total", "Frames for streams not subscribed", lambda: client.decoder.unknown, **L)
+    r.counter("mexcbot_ws_parse_errors_total", "Frames that failed to decode or dispatch", lambda: client.parse_errors, **L)
+    r.gauge("mexcbot_ws_connected", "1 while the WebSocket is open", lambda: client.connected, **L)
+    r.gauge("mexcbot_ws_blind", "1 while the connection is down, stale or resyncing", lambda: client.blind, **L)
+    st = client.stats
+    r.counter("mexcbot_ws_reconnects_total", "Successful reconnects", lambda: st["reconnects"], **L)
+    r.gauge("mexcbot_ws_last_reconnect_seconds", "Downtime of the last reconnect", lambda: st["last_reconnect_sec"], **L)
+    r.gauge("mexcbot_ws_max_reconnect_seconds", "Longest reconnect downtime", lambda: st["max_reconnect_sec"], **L)
+    r.counter("mexcbot_ws_gaps_total", "Trade-id gaps detected", lambda: st["gaps"], **L)
+    r.counter("mexcbot_ws_gap_trades_total", "Trade ids missed in gaps", lambda: st["gap_trades"], **L)
+    r.counter("mexcbot_ws_stale_total", "Times the feed went silent", lambda: st["stale"], **L)
+
+
+def register_executor(ex, registry: Registry = REGISTRY) -> None:
+    r = registry
+    r.gauge("mexcbot_exec_queue_depth", "Commands waiting for the browser", lambda: len(ex._q))
+    r.gauge("mexcbot_exec_busy", "1 while a command is running", lambda: ex.in_flight is not None)
+    for attr, help in (("coalesced", "Commands merged into a queued one"), ("cancelled", "Entries cancelled by a settle"),
+                       ("rejected", "Commands rejected on a full queue"), ("qty_checks", "Staged qty verifications"),
+                       ("qty_repairs", "Staged qty re-typed after drifting")):
+        r.counter(f"mexcbot_exec_{attr}_total", help, lambda a=attr: getattr(ex, a))
+
+
+def register_health(h, registry: Registry = REGISTRY) -> None:
+    r = registry; st = h.stats
+    r.gauge("mexcbot_health_ok", "Executor supervisor verdict", lambda: h.healthy)
+    r.gauge("mexcbot_health_last_check_seconds", "Duration of the last heartbeat + position read",
+            lambda: st["last_check_ms"] / 1e3)
+    r.summary("mexcbot_health_check_seconds", "Heartbeat + position read duration", h.check_hist)
+    for key in ("checks", "failures", "mismatches", "reconciled", "settle_failures", "settle_retries", "escalations"):
+        r.counter(f"mexcbot_health_{key}_total", f"HealthSupervisor {key.replace('_', ' ')}", lambda k=key: st[k])
+
+
+def register_tracer(tr, registry: Registry = REGISTRY) -> None:
+    for stage, h in tr.h.items():
+        registry.summary("mexcbot_latency_seconds", "End-to-end latency per stage (mexcbot_latency)", h, stage=stage)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mexcbot_multi.py
+Multi-symbol engine: one StrategyMonitor per symbol (each with its own
+StrategyConfig) fed from combined-stream connections instead of one process and
+socket per pair.
+
+- Symbols are packed into as few connections as the per-connection stream limit
+  allows (Binance: 1024 streams); WSClient routes each decoded event by symbol.
+- With --processes N the symbols are split into N shards, each running its own
+  connection(s) and monitors in a separate process, so one GIL does not cap the
+  total message rate.
+- Dry-run only: shards trade through DryRunTrader without an AsyncExecutor or
+  HealthSupervisor, so --mode live is rejected (use mexcbot_core.py live per symbol).
+  python mexcbot_multi.py suiusdt btcusdt ethusdt [--config symbols.json [--watch]] [--processes 2]
+symbols.json: {"suiusdt": {"net_entry": 800}, "btcusdt": {"net_entry": 5, "qty": 0.001}}
+"""
+from __future__ import annotations
+import argparse, json, multiprocessing as mp, time
+from dataclasses import asdict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import mexcbot_core as core
+import mexcbot_metrics as metrics
+from mexcbot_decode import build_stream_url, streams_from_url, symbol_streams
+
+MAX_STREAMS_PER_CONN = 1024  # Binance combined-stream limit per connection
+
+
+def connection_urls(symbols: Sequence[str], trade_source: str = core.TRADE_SOURCE,
+                    max_streams: int = MAX_STREAMS_PER_CONN) -> List[str]:
+    """Pack symbols into combined-stream URLs; a symbol's streams never straddle connections."""
+    urls, cur = [], []
+    for sym in symbols:
+        streams = symbol_streams(sym, trade_source)
+        if len(streams) > max_streams:
+            raise ValueError(f"{sym} needs {len(streams)} streams > {max_streams} per connection")
+        if len(cur) + len(streams) > max_streams:
+            urls.append(build_stream_url(cur)); cur = []
+        cur.extend(streams)
+    if cur: urls.append(build_stream_url(cur))
+    return urls
+
+
+def shard(symbols: Sequence[str], n: int) -> List[List[str]]:
+    """Round-robin split into at most n non-empty shards."""
+    n = max(1, min(n, len(symbols)))
+    return [list(symbols[i::n]) for i in range(n)]
+
+
+def dry_run_trader(symbol: str) -> core.BaseTrader:
+    return core.DryRunTrader()
+
+
+class SymbolShard:
+    """Monitors for a group of symbols plus the WS connection(s) that feed them (one process)."""
+    def __init__(self, configs: Dict[str, core.StrategyConfig],
+                 trader_factory: Callable[[str], core.BaseTrader] = dry_run_trader,
+                 max_streams: int = MAX_STREAMS_PER_CONN):
+        self.monitors: Dict[str, core.StrategyMonitor] = {}
+        for sym, cfg in configs.items():
+            log = (lambda m, s=sym.upper(): metrics.log(f"[{s}] {m}"))
+            self.monitors[sym] = core.StrategyMonitor(trader_factory(sym), cfg, log=log)
+            metrics.register_monitor(self.monitors[sym], sym)
+        routes = {sym: (m.on_trade, m.on_depth, m.on_book) for sym, m in self.monitors.items()}
+        self.clients = []
+        for url in connection_urls(list(configs), max_streams=max_streams):
+            streams_here = {s.partition("@")[0] for s in streams_from_url(url)}
+            c = core.WSClient(url, routes={s: routes[s] for s in streams_here})
+            c.blind_listeners.extend(self.monitors[s].set_blind for s in streams_here)
+            metrics.register_ws(c)
+            self.clients.append(c)
+        self.metrics_server = self.control = self.watcher = None
+
+    def start(self, metrics_port: Optional[int] = core.METRICS_PORT, control_port: Optional[int] = core.CONTROL_PORT,
+              config_file: Optional[str] = None, other_symbols: Sequence[str] = ()) -> None:
+        if metrics_port:
+            self.metrics_server = metrics.MetricsServer(metrics_port).start()
+            print(f"[METRICS] {self.metrics_server.url}")
+        if control_port or config_file:
+            import mexcbot_control as control
+            if control_port:
+                self.control = control.ControlServer(self.monitors, control_port).start()
+                print(f"[CONTROL] {self.control.url}/state")
+            if config_file:
+                self.watcher = control.ConfigWatcher(config_file, self.monitors, core.CONFIG_WATCH_SEC, others=other_symbols)
+                self.watcher.poll(); self.watcher.start()
+        for m in self.monitors.values(): m.arm()
+        for c in self.clients: c.start()
+
+    def stop(self) -> None:
+        if self.watcher is not None: self.watcher.stop()
+        if self.control is not None: self.control.close()
+        metrics.LOG.stop()
+        if self.metrics_server is not None: self.metrics_server.close()
+        for c in self.clients:
+            try: c.stop()
+            except Exception: pass
+            print(f"[WS] duplicate trades {c.dedup_stats()}")
+            print(f"[WS] {c.ws_stats()}")
+
+
+def _shard_main(cfg_dicts: Dict[str, Dict[str, float]], max_streams: int, metrics_port: Optional[int],
+                control_port: Optional[int], config_file: Optional[str], other_symbols: List[str]) -> None:
+    configs = {sym: core.StrategyConfig(**d) for sym, d in cfg_dicts.items()}
+    sh = SymbolShard(configs, max_streams=max_streams)
+    sh.start(metrics_port, control_port, config_file, other_symbols)
+    try:
+        while True: time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sh.stop()
+
+
+class MultiSymbolSystem:
+    """
+    Runs symbol shards in-process (processes=1) or in worker processes. Worker
+    shards build their own DryRun traders: a browser session cannot be shared
+    across processes, so live trading across processes needs one trader per shard.
+    """
+    def __init__(self, configs: Dict[str, core.StrategyConfig], processes: int = 1,
+                 trader_factory: Callable[[str], core.BaseTrader] = dry_run_trader,
+                 max_streams: int = MAX_STREAMS_PER_CONN, config_file: Optional[str] = None):
+        self.configs = configs
+        self.config_file = config_file  # watched for live edits (mexcbot_control)
+        self.processes = max(1, processes)
+        self.trader_factory = trader_factory
+        self.max_streams = max_streams
+        self.local: Optional[SymbolShard] = None
+        self.procs: List[mp.Process] = []
+
+    def start(self) -> None:
+        syms = list(self.configs)
+        groups = shard(syms, self.processes)
+        print(f"[MULTI] {len(syms)} symbols, {len(groups)} shard(s), "
+              f"{sum(len(connection_urls(g, max_streams=self.max_streams)) for g in groups)} connection(s)")
+        if len(groups) == 1:
+            self.local = SymbolShard(self.configs, self.trader_factory, self.max_streams)
+            self.local.start(config_file=self.config_file)
+        else:
+            for i, g in enumerate(groups):  # shard i serves /metrics on METRICS_PORT + i, control on CONTROL_PORT + i
+                mport = core.METRICS_PORT + i if core.METRICS_PORT else None
+                cport = core.CONTROL_PORT + i if core.CONTROL_PORT else None
+                others = [s for s in syms if s not in g]
+                p = mp.Process(target=_shard_main, name=f"shard-{g[0]}",
+                               args=({s: asdict(self.configs[s]) for s in g}, self.max_streams, mport, cport,
+                                     self.config_file, others), daemon=True)
+                p.start(); self.procs.append(p)
+        try:
+            while True: time.sleep(1.0)
+        except KeyboardInterrupt:
+            print("\n[CTRL+C] 停止要求を受けました。")
+        finally:
+            if self.local is not None: self.local.stop()
+            for p in self.procs:
+                p.join(2.0)
+                if p.is_alive(): p.terminate()
+            print("[DONE] 停止しました。")
+
+
+def load_configs(symbols: Sequence[str], path: Optional[str]) -> Dict[str, core.StrategyConfig]:
+    overrides: Dict[str, Dict[str, float]] = {}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            overrides = {k.lower(): v for k, v in json.load(f).items()}
+    syms = [s.lower() for s in symbols] or list(overrides)
+    return {s: core.StrategyConfig.from_dict(overrides.get(s, {})) for s in syms}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Run several symbols over combined Binance streams")
+    ap.add_argument("symbols", nargs="*", help="e.g. suiusdt btcusdt (default: keys of --config)")
+    ap.add_argument("--config", help="JSON {symbol: {StrategyConfig field: value}}")
+    ap.add_argument("--processes", type=int, default=1)
+    ap.add_argument("--max-streams", type=int, default=MAX_STREAMS_PER_CONN)
+    ap.add_argument("--watch", action="store_true", help="apply edits to --config while running")
+    ap.add_argument("--mode", choices=("dry-run", "live"), default="dry-run")
+    args = ap.parse_args()
+    if args.mode == "live":
+        # shards only get DryRunTrader and no AsyncExecutor/HealthSupervisor
+        ap.error("live mode is not supported for multiple symbols; run mexcbot_core.py live per symbol")
+    if args.watch and not args.config: ap.error("--watch needs --config")
+    configs = load_configs(args.symbols, args.config)
+    if not configs: ap.error("no symbols given")
+    MultiSymbolSystem(configs, args.processes, max_streams=args.max_streams,
+                      config_file=args.config if args.watch else None).start()
+
+
+if __name__ == "__main__":
+    main()
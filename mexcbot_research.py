@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mexcbot_research.py
+Vectorized NumPy screen of the entry/exit rule over whole tick arrays:
+rolling signed volume over tight_gate_window_sec (cumulative sum + searchsorted
+on timestamps), the spread gate, and candidate entry/exit points.
+Arithmetic mirrors the event path bit for bit (same float timestamps, same
+fixed-point qty as RollingNetVolume), so check_parity() can demand exact equality
+with StrategyMonitor. Cooldown/position/TP/SL are path dependent and stay in the
+replay engine; this is the screen that runs before it.
+  python mexcbot_research.py <tick-dir> [--parity]
+  python mexcbot_research.py --synthetic 2000000 --parity
+"""
+from __future__ import annotations
+import argparse, time
+from typing import Dict, Optional
+
+import numpy as np
+
+import mexcbot_core as core
+
+
+def rolling_net(ts: np.ndarray, signed_fp: np.ndarray, window: float) -> np.ndarray:
+    """Net of fixed-point signed qty over [ts - window, ts], inclusive of the current print."""
+    cum = np.empty(len(signed_fp) + 1, dtype=np.int64)
+    cum[0] = 0
+    np.cumsum(signed_fp, out=cum[1:])
+    start = np.searchsorted(ts, ts - window, side="left")
+    return (cum[1:] - cum[start]) / core.QTY_SCALE
+
+
+def signals(cols, cfg: Optional[core.StrategyConfig] = None) -> Dict[str, np.ndarray]:
+    """
+    Per-trade arrays (index into the trade rows; `row` maps back to the tick set):
+      ts, price, net, tight, long_entry, short_entry, long_exit, short_exit
+    Entries assume a flat book and no cooldown; exits are the net-volume reversal only.
+    """
+    cfg = cfg or core.StrategyConfig()
+    side = np.asarray(cols["side"])
+    row = np.flatnonzero(side != 0)
+    # same float timestamps the replay loop feeds to ReplayClock
+    ts = (np.asarray(cols["recv_ns"]) * 1e-9)[row]
+    if len(ts) > 1 and np.any(ts[1:] < ts[:-1]):
+        raise ValueError("receive timestamps are not monotonic")
+    qty_fp = np.rint(np.asarray(cols["qty"])[row] * core.QTY_SCALE).astype(np.int64)
+    signed = np.where(side[row] > 0, qty_fp, -qty_fp)
+    net = rolling_net(ts, signed, cfg.tight_gate_window_sec)
+    bid = np.asarray(cols["bid"])[row]; ask = np.asarray(cols["ask"])[row]
+    tight = (bid > 0) & (ask > 0) & ((ask - bid) <= cfg.spread_tight_usd)
+    long_entry = tight & (net >= cfg.net_entry)
+    short_entry = tight & ~long_entry & (net <= -cfg.net_entry)
+    return {
+        "row": row, "ts": ts, "price": np.asarray(cols["price"])[row], "net": net, "tight": tight,
+        "long_entry": long_entry, "short_entry": short_entry,
+        "long_exit": net <= -cfg.net_exit, "short_exit": net >= cfg.net_exit,
+    }
+
+
+class _ProbeMonitor(core.StrategyMonitor):
+    """StrategyMonitor that records what it saw on every trade (net, spread gate, entries)."""
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.seen_net = []; self.seen_tight = []; self.entries = []
+        self._i = -1
+    def on_trade(self, price: float, qty: float, is_buy: bool):
+        self._i += 1
+        self.seen_tight.append(self.gate.is_tight())
+        super().on_trade(price, qty, is_buy)
+        self.seen_net.append(self.netwin.net())
+    def _enter(self, side: str, price: float):
+        self.entries.append((self._i, side))
+        super()._enter(side, price)
+
+
+def check_parity(cols, cfg: Optional[core.StrategyConfig] = None) -> Dict[str, int]:
+    """
+    Replays the same ticks through StrategyMonitor and asserts that the vectorized
+    net volume and spread gate are identical on every trade, and that every entry
+    the monitor actually took is a vectorized candidate on the same side.
+    """
+    import mexcbot_replay as rp
+    sig = signals(cols, cfg)
+    probe = {}
+    def factory(trader, clock):
+        probe["m"] = _ProbeMonitor(trader, cfg, clock=clock, log=lambda m: None)
+        return probe["m"]
+    rp.replay(cols, cfg=cfg, monitor_factory=factory)
+    m = probe["m"]
+    net = np.asarray(m.seen_net); tight = np.asarray(m.seen_tight, dtype=bool)
+    if len(net) != len(sig["net"]):
+        raise AssertionError(f"trade count differs: event={len(net)} vector={len(sig['net'])}")
+    bad = np.flatnonzero(net != sig["net"])
+    if len(bad):
+        i = bad[0]; raise AssertionError(f"net differs at trade {i}: event={net[i]!r} vector={sig['net'][i]!r}")
+    bad = np.flatnonzero(tight != sig["tight"])
+    if len(bad):
+        raise AssertionError(f"spread gate differs at trade {bad[0]}")
+    for i, side in m.entries:
+        if not sig["long_entry" if side == "long" else "short_entry"][i]:
+            raise AssertionError(f"monitor entered {side} at trade {i}, not a vector candidate")
+    return {"trades": len(net), "entries": len(m.entries),
+            "candidates": int(sig["long_entry"].sum() + sig["short_entry"].sum())}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Vectorized signal screen")
+    ap.add_argument("path", nargs="?", help="tick directory written by mexcbot_tickstore")
+    ap.add_argument("--synthetic", type=int, default=0)
+    ap.add_argument("--parity", action="store_true", help="also check against StrategyMonitor")
+    args = ap.parse_args()
+    if args.synthetic:
+        import mexcbot_replay as rp
+        cols = rp.synthetic_ticks(args.synthetic)
+    elif args.path:
+        from mexcbot_tickstore import TickReader
+        cols = TickReader(args.path)
+    else:
+        ap.error("path or --synthetic is required")
+    n = len(cols["side"])
+    t0 = time.perf_counter(); sig = signals(cols); dt = time.perf_counter() - t0
+    print(f"{n} ticks ({len(sig['ts'])} trades) screened in {dt * 1e3:.1f} ms = {n / dt / 1e6:.1f} M ticks/s; "
+          f"candidates long={int(sig['long_entry'].sum())} short={int(sig['short_entry'].sum())}")
+    if args.parity:
+        t0 = time.perf_counter(); r = check_parity(cols); dt = time.perf_counter() - t0
+        print(f"parity OK: {r['trades']} trades, {r['entries']} monitor entries within {r['candidates']} candidates "
+              f"(event path {dt:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,649 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mexcbot_sim.py
+Local stand-ins for the outside world, so failure handling can be exercised
+deterministically without Binance:
+
+- FakeWSServer: a minimal RFC 6455 server (stdlib sockets) that serves
+  combined-stream frames to WSClient and can drop connections, go silent or stop
+  answering pings on demand.
+- FeedReplayer: plays recorded (mexcbot_tickstore) or synthetic ticks through the
+  fake server as Binance frames, at market speed or faster (--speed 10).
+- FakeMexcPage: a static futures page with the selectors SeleniumBot clicks
+  (open long/short, Close All + confirm modal, fill toast, qty input, Open tab);
+  orders "fill" after a configurable delay.
+- `resilience` scenario: drives WSClient + StrategyMonitor through a disconnect,
+  a trade-id gap, a stale feed and a dead (pong-less) connection, and checks the
+  blind state and reconnect/gap metrics after each step; then feeds @trade and
+  @aggTrade out of step and checks it only blinds on a gap both streams confirm.
+- `dedup` fuzz: interleaves @trade and @aggTrade frames out of step (optionally
+  lossy) through StreamDecoder and checks every fill is emitted once or counted
+  in a confirmed gap, never both.
+- `pipeline`: feed -> WSClient -> monitor -> executor -> (headless Chrome on the
+  fake page | DryRun), entirely on localhost.
+  python mexcbot_sim.py resilience
+  python mexcbot_sim.py dedup --n 50000 --loss 0.01
+  python mexcbot_sim.py feed ticks/suiusdt-20250101 --speed 10 --port 8765
+  python mexcbot_sim.py page --fill-ms 150 --port 8080
+  python mexcbot_sim.py pipeline --synthetic 20000 --speed 10 --chrome
+"""
+from __future__ import annotations
+import argparse, base64, hashlib, json, random, shutil, socket, struct, subprocess, tempfile, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, List, Optional, Union
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import mexcbot_core as core
+from mexcbot_decode import DEPTH_STREAM, StreamDecoder, build_stream_url
+
+_WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def _recv_exact(conn: socket.socket, n: int) -> bytes:
+    buf = b""
+    while len(buf) < n:
+        chunk = conn.recv(n - len(buf))
+        if not chunk: raise ConnectionError("peer closed")
+        buf += chunk
+    return buf
+
+
+def _frame(opcode: int, payload: bytes) -> bytes:
+    """Server -> client frame (FIN set, unmasked)."""
+    n = len(payload)
+    if n < 126: head = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 1 << 16: head = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else: head = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    return head + payload
+
+
+class FakeWSServer:
+    """
+    Accepts any number of WS clients on 127.0.0.1 and broadcasts what send() is given.
+      paused        frames passed to send() are discarded (feed goes silent, TCP stays up)
+      answer_pings  False = pings are swallowed, so the client's ping timeout fires
+      drop()        closes every client socket without a close frame
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port)); self.sock.listen(8)
+        self.host, self.port = self.sock.getsockname()
+        self.paused = False
+        self.answer_pings = True
+        self.connections = 0  # handshakes completed
+        self._clients: List[socket.socket] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def url(self, streams: Iterable[str]) -> str:
+        return build_stream_url(streams, base=f"ws://{self.host}:{self.port}/stream?streams=")
+
+    def start(self) -> "FakeWSServer":
+        threading.Thread(target=self._accept, name="fake-ws-accept", daemon=True).start()
+        return self
+
+    def _accept(self) -> None:
+        while not self._closed:
+            try: conn, _ = self.sock.accept()
+            except OSError: return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        try:
+            req = b""
+            while b"\r\n\r\n" not in req:
+                chunk = conn.recv(4096)
+                if not chunk: return
+                req += chunk
+            key = b""
+            for line in req.split(b"\r\n"):
+                if line.lower().startswith(b"sec-websocket-key:"): key = line.split(b":", 1)[1].strip()
+            accept = base64.b64encode(hashlib.sha1(key + _WS_GUID).digest())
+            conn.sendall(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                         b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+            with self._lock:
+                self._clients.append(conn); self.connections += 1
+            while True:
+                b0, b1 = _recv_exact(conn, 2)
+                opcode, n = b0 & 0x0F, b1 & 0x7F
+                if n == 126: n = struct.unpack("!H", _recv_exact(conn, 2))[0]
+                elif n == 127: n = struct.unpack("!Q", _recv_exact(conn, 8))[0]
+                mask = _recv_exact(conn, 4) if b1 & 0x80 else b"\0\0\0\0"
+                payload = bytes(c ^ mask[i & 3] for i, c in enumerate(_recv_exact(conn, n)))
+                if opcode == 0x9 and self.answer_pings:
+                    self._sendto(conn, _frame(0xA, payload))
+                elif opcode == 0x8:
+                    self._sendto(conn, _frame(0x8, payload[:2])); return
+        except (OSError, ConnectionError, ValueError):
+            return
+        finally:
+            with self._lock:
+                if conn in self._clients: self._clients.remove(conn)
+            try: conn.close()
+            except OSError: pass
+
+    def _sendto(self, conn: socket.socket, data: bytes) -> None:
+        with self._lock:
+            try: conn.sendall(data)
+            except OSError: pass
+
+    def send(self, msg: Union[str, dict]) -> int:
+        """Broadcast one text frame; returns the number of clients it went to."""
+        if self.paused: return 0
+        data = _frame(0x1, (msg if isinstance(msg, str) else json.dumps(msg)).encode())
+        with self._lock:
+            clients = list(self._clients)
+            for c in clients:
+                try: c.sendall(data)
+                except OSError: pass
+        return len(clients)
+
+    def drop(self) -> None:
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for c in clients:
+            try: c.shutdown(socket.SHUT_RDWR); c.close()
+            except OSError: pass
+
+    def close(self) -> None:
+        self._closed = True
+        self.drop()
+        try: self.sock.close()
+        except OSError: pass
+
+
+# ===== Frames =====
+def trade_frame(symbol: str, trade_id: int, price: float, qty: float, is_buy: bool) -> dict:
+    ms = int(time.time() * 1000)
+    return {"stream": f"{symbol}@trade",
+            "data": {"e": "trade", "E": ms, "s": symbol.upper(), "t": trade_id, "p": f"{price:.4f}",
+                     "q": f"{qty:.1f}", "T": ms, "m": not is_buy}}
+
+
+def agg_frame(symbol: str, agg_id: int, first_id: int, last_id: int, price: float, qty: float, is_buy: bool) -> dict:
+    ms = int(time.time() * 1000)
+    return {"stream": f"{symbol}@aggTrade",
+            "data": {"e": "aggTrade", "E": ms, "s": symbol.upper(), "a": agg_id, "p": f"{price:.4f}",
+                     "q": f"{qty:.1f}", "f": first_id, "l": last_id, "T": ms, "m": not is_buy}}
+
+
+def depth_frame(symbol: str, bid: float, ask: float, update_id: int = 0) -> dict:
+    return {"stream": f"{symbol}@{DEPTH_STREAM}",
+            "data": {"lastUpdateId": update_id, "bids": [[f"{bid:.4f}", "1000"]], "asks": [[f"{ask:.4f}", "1000"]]}}
+
+
+class FeedReplayer(threading.Thread):
+    """
+    Plays tick-store columns (TickReader or synthetic_ticks) through a FakeWSServer as
+    Binance @trade / @depth frames. speed=1 keeps the recorded inter-arrival times,
+    10 plays ten times faster, 0 sends as fast as the socket takes it. Trade ids are
+    consecutive from `first_id`; E/T carry the send time so exch->recv latency stays real.
+    """
+    def __init__(self, server: FakeWSServer, cols, symbol: str, speed: float = 1.0, first_id: int = 1):
+        super().__init__(name="feed-replay", daemon=True)
+        self.server = server
+        self.cols = cols
+        self.symbol = symbol
+        self.speed = float(speed)
+        self.next_id = first_id
+        self.sent = 0
+        self.lag_max = 0.0  # worst lateness behind the schedule (sec)
+        self._stop_evt = threading.Event()
+
+    def run(self) -> None:
+        sym = self.symbol
+        recv = self.cols["recv_ns"]; side = self.cols["side"]; price = self.cols["price"]
+        qty = self.cols["qty"]; bid = self.cols["bid"]; ask = self.cols["ask"]
+        n = len(recv)
+        if n == 0: return
+        t0 = time.monotonic(); r0 = int(recv[0]); inv = 1.0 / self.speed if self.speed > 0 else 0.0
+        for i in range(n):
+            if self._stop_evt.is_set(): return
+            if inv:
+                due = t0 + (int(recv[i]) - r0) * 1e-9 * inv
+                delay = due - time.monotonic()
+                if delay > 0.0005: time.sleep(delay)
+                elif -delay > self.lag_max: self.lag_max = -delay
+            s = int(side[i])
+            if s == 0:
+                frame = depth_frame(sym, float(bid[i]), float(ask[i]), update_id=i)
+            else:
+                frame = trade_frame(sym, self.next_id, float(price[i]), float(qty[i]), s > 0)
+                self.next_id += 1
+            self.server.send(frame); self.sent += 1
+
+    def stop(self) -> None:
+        self._stop_evt.set()
+
+
+# ===== Fake MEXC futures page =====
+# Same selectors SeleniumBot uses on the real page. Query parameters:
+#   fill_ms   click -> fill toast delay (default 150)    close_ms  Close All confirm -> toast (default fill_ms)
+#   modal_ms  Close All -> confirm modal (default 100)    toast_ms  toast lifetime (default 3000)
+#   reject    probability that an order is rejected (toast "Order failed")
+FAKE_MEXC_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>SUI_USDT Perpetual | fake MEXC</title>
+<style>
+ body{font-family:sans-serif;margin:0;background:#111;color:#ddd}
+ #mexc-web-futures-exchange-handle-content-right{position:absolute;right:0;top:0;width:340px;padding:12px}
+ button{display:block;width:100%;margin:6px 0;padding:10px;font-size:15px;cursor:pointer}
+ button[data-testid=contract-trade-open-long-btn]{background:#0a7}
+ button[data-testid=contract-trade-open-short-btn]{background:#d33}
+ .ant-modal-wrap{display:none;position:fixed;inset:0;background:rgba(0,0,0,.5)}
+ .ant-modal-content{width:300px;margin:120px auto;background:#222;padding:16px}
+ .ant-notification{position:fixed;left:16px;top:16px}
+ .ant-notification-notice{background:#333;padding:10px 14px;margin-bottom:6px}
+ #sim-positions{margin-top:16px;font-size:13px}
+</style></head>
+<body>
+<div id="mexc-web-futures-exchange-handle-content-right">
+  <div class="order-form-tabs"><span data-testid="contract-trade-order-form-tab-open">Open</span> <span>Close</span></div>
+  <div id="mexc_contract_v_open_position">
+    <div class="input-wrapper"><div class="extend-wrapper"><input class="ant-input" type="text" value="" autocomplete="off"></div></div>
+  </div>
+  <button data-testid="contract-trade-open-long-btn">Open Long</button>
+  <button data-testid="contract-trade-open-short-btn">Open Short</button>
+  <div class="CloseAllPosition_closeAllPosition__x8Ke2"><button>Close All</button></div>
+  <div class="FastClose_long__p1Qa"><button class="FastClose_closeBtn__d9Xw">Close Short</button></div>
+  <div class="FastClose_short__k2Rb"><button class="FastClose_closeBtn__d9Xw">Close Long</button></div>
+  <div id="sim-positions"></div>
+</div>
+<div class="ant-modal-wrap"><div class="ant-modal"><div class="ant-modal-content">
+  <div class="ant-modal-body">Close all positions at market price?</div>
+  <div class="ant-modal-footer"><button class="ant-btn">Cancel</button><button class="ant-btn ant-btn-primary">Confirm</button></div>
+</div></div></div>
+<div class="ant-notification"></div>
+<script>
+(function(){
+  var q = new URLSearchParams(location.search);
+  var num = function(k, d){ var v = parseFloat(q.get(k)); return isNaN(v) ? d : v; };
+  var cfg = {fill_ms: num("fill_ms", 150), modal_ms: num("modal_ms", 100), toast_ms: num("toast_ms", 3000), reject: num("reject", 0)};
+  cfg.close_ms = num("close_ms", cfg.fill_ms);
+  var sim = window.__sim = {cfg: cfg, position: 0, fills: [], clicks: 0};
+  var $ = function(s){ return document.querySelector(s); };
+  var input = $("#mexc_contract_v_open_position input.ant-input");
+  var notes = $(".ant-notification"), modal = $(".ant-modal-wrap");
+  function render(){
+    $("#sim-positions").textContent = sim.position ? ((sim.position > 0 ? "LONG " : "SHORT ") + Math.abs(sim.position)) : "No position";
+    // like the real page, quick-close buttons only exist while a position is open
+    $("div[class^=FastClose_short]").style.display = sim.position > 0 ? "" : "none";
+    $("div[class^=FastClose_long]").style.display = sim.position < 0 ? "" : "none";
+  }
+  function clearToasts(){ notes.innerHTML = ""; }
+  function toast(msg){
+    var n = document.createElement("div"); n.className = "ant-notification-notice";
+    var m = document.createElement("div"); m.className = "ant-notification-notice-message"; m.textContent = msg;
+    n.appendChild(m); notes.appendChild(n);
+    setTimeout(function(){ if (n.parentNode) n.parentNode.removeChild(n); }, cfg.toast_ms);
+  }
+  function fill(delta, msg, delay){
+    sim.clicks++; clearToasts();
+    setTimeout(function(){
+      if (Math.random() < cfg.reject) { toast("Order failed"); return; }
+      sim.position += delta; sim.fills.push({t: performance.now(), delta: delta}); render(); toast(msg);
+    }, delay);
+  }
+  sim.liquidate = function(){ sim.position = 0; render(); };  // position closed outside the bot
+  function qty(){ var v = parseFloat(input.value); return isNaN(v) ? 0 : v; }
+  $("button[data-testid=contract-trade-open-long-btn]").onclick = function(){ fill(qty(), "SUI_USDT: order filled completely", cfg.fill_ms); };
+  $("button[data-testid=contract-trade-open-short-btn]").onclick = function(){ fill(-qty(), "SUI_USDT: order filled completely", cfg.fill_ms); };
+  $("div[class^=FastClose_short] button").onclick = function(){ if (sim.position > 0) fill(-sim.position, "SUI_USDT: order filled completely", cfg.close_ms); };
+  $("div[class^=FastClose_long] button").onclick = function(){ if (sim.position < 0) fill(-sim.position, "SUI_USDT: order filled completely", cfg.close_ms); };
+  $("div[class^=CloseAllPosition_closeAllPosition]").onclick = function(){
+    clearToasts(); setTimeout(function(){ modal.style.display = "block"; }, cfg.modal_ms);
+  };
+  modal.querySelector("button.ant-btn-primary").onclick = function(){
+    modal.style.display = "none"; fill(-sim.position, "Order Filled", cfg.close_ms);
+  };
+  modal.querySelector("button.ant-btn:not(.ant-btn-primary)").onclick = function(){ modal.style.display = "none"; };
+  render();
+})();
+</script>
+</body></html>
+"""
+
+
+class FakeMexcPage:
+    """Serves FAKE_MEXC_HTML on 127.0.0.1 (any path) from a background HTTP server."""
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        body = FAKE_MEXC_HTML.encode()
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers(); self.wfile.write(body)
+            def log_message(self, *a): pass
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.host, self.port = self.httpd.server_address[:2]
+
+    def url(self, fill_ms: float = 150, **params) -> str:
+        q = urlencode({"fill_ms": fill_ms, **params})
+        return f"http://{self.host}:{self.port}/en-US/futures/SUI_USDT?{q}"
+
+    def start(self) -> "FakeMexcPage":
+        threading.Thread(target=self.httpd.serve_forever, name="fake-mexc-page", daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        self.httpd.shutdown(); self.httpd.server_close()
+
+
+CHROME_BINARIES = ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome")
+
+def launch_chrome(url: str, port: int = 9333, binary: Optional[str] = None, headless: bool = True,
+                  timeout: float = 15.0) -> subprocess.Popen:
+    """Starts a throwaway Chrome with a remote debugging port (what SeleniumBot/CDP attach to) on `url`."""
+    binary = binary or next((b for b in map(shutil.which, CHROME_BINARIES) if b), None)
+    if not binary: raise RuntimeError("no Chrome/Chromium binary found (give --chrome-bin)")
+    args = [binary, f"--remote-debugging-port={port}", f"--user-data-dir={tempfile.mkdtemp(prefix='mexcbot-chrome-')}",
+            "--no-first-run", "--no-default-browser-check", "--disable-gpu", "--no-sandbox"]
+    if headless: args.append("--headless=new")
+    proc = subprocess.Popen(args + [url], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            urlopen(f"http://127.0.0.1:{port}/json/version", timeout=0.5).read(); return proc
+        except Exception:
+            if proc.poll() is not None: raise RuntimeError(f"Chrome exited with {proc.returncode}")
+            time.sleep(0.1)
+    proc.kill(); raise RuntimeError("Chrome debugging port did not come up")
+
+
+# ===== Offline pipeline =====
+def pipeline(cols, symbol: str = "suiusdt", speed: float = 10.0, fill_ms: float = 150,
+             trader: Optional[core.BaseTrader] = None, cfg: Optional[core.StrategyConfig] = None) -> dict:
+    """
+    FeedReplayer -> FakeWSServer -> WSClient -> StrategyMonitor -> AsyncExecutor -> trader,
+    all on localhost. `trader` defaults to DryRun; pass MexcTrader attached to a Chrome on
+    the fake page to load-test the executor. Returns counters; the latency report is printed.
+    """
+    from mexcbot_latency import LatencyTracer
+    srv = FakeWSServer().start()
+    exe = core.AsyncExecutor(trader or core.DryRunTrader())
+    mon = core.StrategyMonitor(exe, cfg)
+    exe.on_report = mon.on_exec_report
+    tracer = LatencyTracer(dump_every_sec=0)
+    client = core.WSClient(srv.url([f"{symbol}@trade", f"{symbol}@{DEPTH_STREAM}"]), mon.on_trade, mon.on_depth,
+                           on_book=mon.on_book)
+    client.blind_listeners.append(mon.set_blind)
+    client.tracer = mon.tracer = exe.tracer = tracer
+    feed = FeedReplayer(srv, cols, symbol, speed)
+    client.start()
+    t0 = time.perf_counter()
+    try:
+        _wait(lambda: client.connected, 5, "WSClient connect")
+        feed.start(); feed.join()
+        time.sleep(max(0.5, fill_ms / 1e3 * 3))  # let the last orders fill
+    finally:
+        feed.stop(); client.stop(); exe.stop(); srv.close()
+    dt = time.perf_counter() - t0
+    tracer.dump()
+    return {"frames": feed.sent, "sec": round(dt, 2), "frames_per_sec": round(feed.sent / dt),
+            "schedule_lag_max_ms": round(feed.lag_max * 1e3, 2), "coalesced": exe.coalesced,
+            "cancelled": exe.cancelled, "rejected": exe.rejected, **client.stats}
+
+
+# ===== Resilience scenario =====
+def _wait(cond: Callable[[], bool], timeout: float, what: str) -> None:
+    end = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > end: raise AssertionError(f"timed out waiting for: {what}")
+        time.sleep(0.01)
+
+
+def resilience(symbol: str = "suiusdt", log: Callable[[str], None] = print) -> dict:
+    """Runs the scenario against a FakeWSServer; raises AssertionError on the first failed check."""
+    srv = FakeWSServer().start()
+    mon = core.StrategyMonitor(core.DryRunTrader(), log=lambda m: None)
+    events = []
+    client = core.WSClient(srv.url([f"{symbol}@trade", f"{symbol}@{DEPTH_STREAM}"]), mon.on_trade, mon.on_depth,
+                           on_book=mon.on_book)
+    client.blind_listeners += [mon.set_blind, lambda b, r: events.append((b, r))]
+    client.ping_interval, client.ping_timeout = 0.4, 0.2
+    client.backoff_base, client.backoff_max = 0.05, 0.2
+    client.stale_sec, client.stale_reconnect_sec = 0.3, 0.9
+    client.resync_warmup_sec = 0.3
+    tid = [0]
+    def tape(n: int = 3, skip: int = 0) -> None:
+        tid[0] += skip
+        srv.send(depth_frame(symbol, 1.0000, 1.0001))
+        for _ in range(n):
+            tid[0] += 1; srv.send(trade_frame(symbol, tid[0], 1.0, 10.0, True))
+    def step(name: str) -> None: log(f"[SIM] {name}: blind={client.blind} {client.ws_stats()}")
+
+    client.start()
+    try:
+        _wait(lambda: srv.connections == 1 and client.connected, 3, "first connect")
+        if not mon.blind: raise AssertionError("monitor must start blind until the first snapshot")
+        tape(); _wait(lambda: not mon.blind, 2, "unblind after snapshot")
+        step("connected")
+
+        # 1) abrupt disconnect -> blind, redial; missed ids on the new connection -> gap + warmup
+        srv.drop()
+        _wait(lambda: mon.blind, 2, "blind after drop")
+        _wait(lambda: srv.connections == 2 and client.connected, 3, "reconnect after drop")
+        tape(skip=5)
+        _wait(lambda: client.stats["gaps"] == 1, 2, "gap detected")
+        if client.stats["gap_trades"] != 5: raise AssertionError(f"gap size {client.stats['gap_trades']} != 5")
+        t_gap = time.monotonic()
+        while time.monotonic() - t_gap < 0.2:
+            if not mon.blind: raise AssertionError("unblinded before the resync warmup")
+            tape(1); time.sleep(0.02)
+        _wait(lambda: (tape(1), not mon.blind)[1], 2, "unblind after warmup")
+        if client.stats["reconnects"] != 1: raise AssertionError(f"reconnects={client.stats['reconnects']}")
+        step("disconnect + gap")
+
+        # 2) silent feed -> blind (stale) -> forced reconnect
+        srv.paused = True
+        _wait(lambda: mon.blind and client.stats["stale"] == 1, 2, "stale blind")
+        _wait(lambda: srv.connections == 3, 3, "forced reconnect on stale feed")
+        srv.paused = False
+        _wait(lambda: (tape(1), not mon.blind)[1], 3, "unblind after stale")
+        step("stale feed")
+
+        # 3) peer stops answering pings -> ping timeout -> reconnect
+        srv.answer_pings = False
+        _wait(lambda: srv.connections == 4, 5, "reconnect on ping timeout")
+        srv.answer_pings = True
+        _wait(lambda: (tape(1), not mon.blind)[1], 3, "unblind after ping timeout")
+        step("ping timeout")
+
+        # 4) entries are refused while blind; "flatten" closes an open position on blind
+        mon.timers.cooldown_until = 0.0
+        srv.paused = True
+        _wait(lambda: mon.blind, 2, "blind for entry check")
+        mon.on_depth(1.0000, 1.0001)
+        mon.on_trade(1.0, 5000.0, True)
+        if mon.position is not None: raise AssertionError("entered while blind")
+        srv.paused = False
+        _wait(lambda: (tape(1), not mon.blind)[1], 3, "unblind for flatten check")
+        mon.blind_policy = "flatten"
+        mon.position, mon.entry_price = "long", 1.0
+        srv.drop()
+        _wait(lambda: mon.position is None, 2, "flatten on blind")
+        step("blind entry gate / flatten")
+    finally:
+        client.stop(); srv.close()
+        client.join(2.0)
+    if client.is_alive(): raise AssertionError("WSClient thread did not stop")
+    merged = _merged_streams(symbol, log)
+    return dict(client.stats, blind_events=len(events), merged_late=merged["late"])
+
+
+def _merged_streams(symbol: str, log: Callable[[str], None]) -> dict:
+    """
+    5) @trade + @aggTrade subscribed, each stream leading in turn: no blind and every
+    fill delivered once; a hole only blinds once both streams are past it.
+    """
+    srv = FakeWSServer().start()
+    mon = core.StrategyMonitor(core.DryRunTrader(), log=lambda m: None)
+    ids, events = [], []
+    def on_trade(price: float, qty: float, is_buy: bool) -> None:
+        ids.append(int(qty)); mon.on_trade(price, qty, is_buy)  # qty carries the trade id
+    client = core.WSClient(srv.url([f"{symbol}@trade", f"{symbol}@aggTrade", f"{symbol}@{DEPTH_STREAM}"]),
+                           on_trade, mon.on_depth)
+    client.blind_listeners += [mon.set_blind, lambda b, r: events.append((b, r))]
+    client.resync_warmup_sec = 0.3
+    def trades(lo: int, hi: int, skip=()) -> None:
+        for t in range(lo, hi + 1):
+            if t not in skip: srv.send(trade_frame(symbol, t, 1.0, float(t), t % 2 == 0))
+    def aggs(lo: int, hi: int, skip=()) -> None:  # one id per aggTrade so qty stays the id
+        for t in range(lo, hi + 1):
+            if t not in skip: srv.send(agg_frame(symbol, t, t, t, 1.0, float(t), t % 2 == 0))
+    client.start()
+    try:
+        _wait(lambda: client.connected, 3, "merged connect")
+        srv.send(depth_frame(symbol, 1.0000, 1.0001)); trades(1, 1)
+        _wait(lambda: not client.blind, 2, "merged unblind")
+        n_blind = len(events)
+        trades(2, 60, skip=range(20, 31))  # @trade leads with a hole, @aggTrade fills it late
+        aggs(2, 60)
+        aggs(61, 120, skip=range(90, 96))  # then @aggTrade leads, @trade fills its hole
+        trades(61, 120)
+        _wait(lambda: len(ids) == 120, 2, "every merged fill delivered")
+        if sorted(ids) != list(range(1, 121)): raise AssertionError("merged fills lost or doubled")
+        if client.blind or len(events) != n_blind or client.stats["gaps"]:
+            raise AssertionError(f"blinded without a confirmed gap: {events[n_blind:]} gaps={client.stats['gaps']}")
+        step_ids = len(ids)
+        trades(121, 140, skip=range(125, 128))  # missing on @trade only: not a gap yet
+        _wait(lambda: len(ids) == step_ids + 17, 2, "lead stream delivered")
+        if client.blind: raise AssertionError("blinded while @aggTrade could still fill the hole")
+        aggs(121, 140, skip=range(125, 128))  # and on @aggTrade: confirmed gap of 3
+        _wait(lambda: client.stats["gaps"] == 1 and client.blind, 2, "blind on a confirmed gap")
+        if client.stats["gap_trades"] != 3: raise AssertionError(f"gap size {client.stats['gap_trades']} != 3")
+        log(f"[SIM] merged streams: blind={client.blind} {client.dedup_stats()}")
+        d = client.decoder.dedupers[symbol]
+        return {"late": d.filled}
+    finally:
+        client.stop(); srv.close()
+        client.join(2.0)
+
+
+def dedup_fuzz(n: int = 20000, seed: int = 0, loss: float = 0.0, symbol: str = "suiusdt") -> dict:
+    """
+    n fills as one @trade per id plus @aggTrade ranges of 1-4 ids, the two streams
+    interleaved in bursts so either one leads by up to max_lead ids; `loss`
+    drops that fraction of frames from each stream. Raises AssertionError unless:
+    no id is emitted twice, every delivered @trade id is emitted, each emitted
+    event's qty matches its ids, and emitted + confirmed-gap + still-open-hole ids
+    account for every id from the first emitted one up to the highest (lossless: no
+    gaps at all). Ids before the first emitted event predate the merge and are skipped.
+    """
+    max_lead = 300
+    rnd = random.Random(seed)
+    qty = [0] + [rnd.randint(1, 50) for _ in range(n)]
+    trades, aggs, i = [], [], 1  # (last id in the frame, frame)
+    for t in range(1, n + 1):
+        if rnd.random() >= loss: trades.append((t, json.dumps(trade_frame(symbol, t, 1.0, qty[t], True))))
+    while i <= n:
+        j = min(n, i + rnd.randint(0, 3))
+        if rnd.random() >= loss: aggs.append((j, json.dumps(agg_frame(symbol, i, i, j, 1.0, sum(qty[i:j + 1]), True))))
+        i = j + 1
+    delivered = [t for t, _ in trades]
+    decoder = StreamDecoder([f"{symbol}@trade", f"{symbol}@aggTrade"])
+    dd = decoder.dedupers[symbol]
+    seen = [0] * (n + 1)
+    ti = ai = 0; first = 0
+    while ti < len(trades) or ai < len(aggs):
+        use_trade = ai >= len(aggs) or (ti < len(trades) and rnd.random() < 0.5)
+        for _ in range(rnd.randint(1, 40)):  # a burst from one stream puts it ahead of the other
+            pt = trades[ti][0] if ti < len(trades) else n + 1; pa = aggs[ai][0] if ai < len(aggs) else n + 1
+            if use_trade and ti < len(trades) and pt - pa <= max_lead: ev = decoder.decode(trades[ti][1]); ti += 1
+            elif not use_trade and ai < len(aggs) and pa - pt <= max_lead: ev = decoder.decode(aggs[ai][1]); ai += 1
+            else: break
+            if ev is None: continue
+            first = first or ev.first_id
+            for t in range(ev.first_id, ev.last_id + 1): seen[t] += 1
+            if ev.qty != sum(qty[ev.first_id:ev.last_id + 1]): raise AssertionError(f"qty mismatch for {ev.first_id}..{ev.last_id}")
+    emitted = sum(1 for c in seen[first:] if c)
+    if max(seen) > 1: raise AssertionError(f"ids emitted twice: {[t for t, c in enumerate(seen) if c > 1][:10]}")
+    missed = [t for t in delivered if t >= first and not seen[t]]
+    if missed: raise AssertionError(f"delivered @trade ids never emitted: {sorted(missed)[:10]}")
+    open_ids = sum(hi - lo + 1 for lo, hi in dd.holes)
+    if emitted + dd.gap_trades + open_ids != dd.last_id - first + 1:
+        raise AssertionError(f"emitted={emitted} gap_trades={dd.gap_trades} open={open_ids} last_id={dd.last_id}")
+    if not loss and (dd.gaps or first != 1 or emitted != n): raise AssertionError(f"lossless feed: gaps={dd.gaps} emitted={emitted}/{n}")
+    return {"ids": n, "emitted": emitted, "late": dd.filled, "dropped": dd.dropped,
+            "partial_agg": dd.dropped_partial, "gaps": dd.gaps, "gap_trades": dd.gap_trades}
+
+
+def _load_cols(args):
+    if args.synthetic:
+        import mexcbot_replay as rp
+        return rp.synthetic_ticks(args.synthetic)
+    if not args.path: raise SystemExit("path or --synthetic is required")
+    from mexcbot_tickstore import TickReader
+    return TickReader(args.path)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Local simulators")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("resilience", help="WSClient reconnect / gap / stale scenario against a fake server")
+    r.add_argument("--symbol", default="suiusdt")
+    d = sub.add_parser("dedup", help="@trade/@aggTrade merge fuzz (out-of-step and lossy interleavings)")
+    d.add_argument("--n", type=int, default=20000)
+    d.add_argument("--seed", type=int, default=0)
+    d.add_argument("--loss", type=float, default=0.0, help="fraction of frames dropped per stream")
+    for name, hlp in (("feed", "serve ticks as a fake Binance combined stream"),
+                      ("pipeline", "run the whole bot against the local feed (and page)")):
+        p = sub.add_parser(name, help=hlp)
+        p.add_argument("path", nargs="?", help="tick directory written by mexcbot_tickstore")
+        p.add_argument("--synthetic", type=int, default=0)
+        p.add_argument("--symbol", default=core.SYMBOL)
+        p.add_argument("--speed", type=float, default=1.0, help="x market speed (10 = ten times faster, 0 = unpaced)")
+    sub.choices["feed"].add_argument("--port", type=int, default=8765)
+    pg = sub.add_parser("page", help="serve the fake MEXC futures page")
+    pg.add_argument("--port", type=int, default=8080)
+    pl = sub.choices["pipeline"]
+    for p in (pg, pl):
+        p.add_argument("--fill-ms", type=float, default=150.0)
+    pl.add_argument("--chrome", action="store_true", help="execute through SeleniumBot on a headless Chrome")
+    pl.add_argument("--chrome-bin")
+    pl.add_argument("--backend", choices=("selenium", "cdp"), default=core.EXEC_BACKEND)
+    pl.add_argument("--debug-port", type=int, default=9333)
+    args = ap.parse_args()
+
+    if args.cmd == "resilience":
+        t0 = time.perf_counter()
+        st = resilience(args.symbol)
+        core.metrics.LOG.stop()
+        print(f"resilience OK in {time.perf_counter() - t0:.1f}s: {st}")
+    elif args.cmd == "dedup":
+        print(f"dedup OK: {dedup_fuzz(args.n, args.seed, args.loss)}")
+    elif args.cmd == "feed":
+        srv = FakeWSServer(port=args.port).start()
+        print(f"[SIM] feed at {srv.url([f'{args.symbol}@trade', f'{args.symbol}@{DEPTH_STREAM}'])}")
+        print("[SIM] waiting for a client...")
+        _wait(lambda: srv.connections > 0, 1e9, "client")
+        feed = FeedReplayer(srv, _load_cols(args), args.symbol, args.speed)
+        feed.start(); feed.join()
+        print(f"[SIM] {feed.sent} frames sent, max schedule lag {feed.lag_max * 1e3:.1f} ms")
+        srv.close()
+    elif args.cmd == "page":
+        page = FakeMexcPage(port=args.port).start()
+        print(f"[SIM] fake MEXC page at {page.url(args.fill_ms)}  (Ctrl+C to stop)")
+        try:
+            while True: time.sleep(1.0)
+        except KeyboardInterrupt:
+            page.close()
+    else:
+        cols = _load_cols(args)
+        trader, page, chrome = None, None, None
+        if args.chrome:
+            page = FakeMexcPage().start()
+            chrome = launch_chrome(page.url(args.fill_ms), args.debug_port, args.chrome_bin)
+            trader = core.make_ui_trader(args.backend, f"127.0.0.1:{args.debug_port}")
+        try:
+            print(f"[SIM] pipeline: {pipeline(cols, args.symbol, args.speed, args.fill_ms, trader)}")
+        finally:
+            if chrome is not None: chrome.terminate()
+            if page is not None: page.close()
+
+
+if __name__ == "__main__":
+    main()
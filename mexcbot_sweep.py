@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mexcbot_sweep.py
+Grid / random parameter sweep over StrategyConfig, one replay per parameter set,
+fanned out over a process pool. Workers memory-map the same tick set (the OS page
+cache is shared), so only parameter dicts and summaries cross process boundaries.
+  python mexcbot_sweep.py <tick-dir> --grid net_entry=600,800,1000 net_exit=500,752
+  python mexcbot_sweep.py <tick-dir> --random 256 --range net_entry=400:1500 take_profit_pct=0.0005:0.002
+  python mexcbot_sweep.py --synthetic 500000 --grid net_entry=400,800 --workers 4
+"""
+from __future__ import annotations
+import argparse, contextlib, csv, itertools, multiprocessing as mp, os, random, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import mexcbot_core as core
+import mexcbot_replay as rp
+
+
+def grid(space: Dict[str, Sequence[float]]) -> List[Dict[str, float]]:
+    names = list(space)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(space[n] for n in names))]
+
+
+def random_samples(ranges: Dict[str, Tuple[float, float]], n: int, seed: int = 0) -> List[Dict[str, float]]:
+    rnd = random.Random(seed)
+    return [{k: rnd.uniform(lo, hi) for k, (lo, hi) in ranges.items()} for _ in range(n)]
+
+
+def pool_context():
+    """
+    forkserver with the replay stack preloaded: each worker forks from a warm server
+    (no per-worker imports, no threads inherited from the caller). spawn where fork
+    is unavailable (Windows).
+    """
+    if "forkserver" in mp.get_all_start_methods():
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload(["__main__", "mexcbot_replay", "mexcbot_tickstore"])
+        return ctx
+    return mp.get_context("spawn")
+
+
+# --- worker side: one TickReader per process, opened once by the initializer ---
+_W: Dict[str, object] = {}
+
+def _init_worker(path: str, base: Dict[str, float], sim: Dict[str, float]) -> None:
+    from mexcbot_tickstore import TickReader
+    _W["cols"] = TickReader(path)
+    _W["base"] = core.StrategyConfig.from_dict(base)
+    _W["sim"] = sim
+
+def _run_one(task: Tuple[int, Dict[str, float]]) -> Tuple[int, Dict[str, float], Dict[str, float]]:
+    idx, params = task
+    cfg = _W["base"].updated(params)
+    res = rp.replay(_W["cols"], cfg=cfg, **_W["sim"])
+    return idx, params, res.summary
+
+
+def sweep(path: str, space: List[Dict[str, float]], base: Optional[core.StrategyConfig] = None,
+          workers: Optional[int] = None, latency_sec: float = 0.15, slippage_bps: float = 1.0,
+          fee_bps: float = 0.0) -> List[Dict[str, float]]:
+    """
+    Run one replay per parameter set; returns full-config rows sorted by PnL (best first).
+    Every set is validated (StrategyConfig.updated) before the pool starts.
+    """
+    base = base or core.StrategyConfig()
+    for params in space: base.updated(params)  # KeyError / ValueError
+    sim = {"latency_sec": latency_sec, "slippage_bps": slippage_bps, "fee_bps": fee_bps}
+    workers = workers or os.cpu_count() or 1
+    tasks = list(enumerate(space))
+    # a few chunks per worker keeps IPC low while still balancing uneven run times
+    chunksize = max(1, len(tasks) // (workers * 4))
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(), initializer=_init_worker,
+                             initargs=(path, asdict(base), sim)) as pool:
+        for idx, params, summary in pool.map(_run_one, tasks, chunksize=chunksize):
+            rows.append({"id": idx, **asdict(base), **params, **summary})
+    rows.sort(key=lambda r: r["pnl"], reverse=True)
+    return rows
+
+
+def print_table(rows: List[Dict[str, float]], swept: Sequence[str], top: int = 20) -> None:
+    head = f"{'#':>3} {'pnl':>10} {'win%':>6} {'trades/h':>9} {'max_dd':>9} {'trades':>6}  " + "  ".join(swept)
+    print(head); print("-" * len(head))
+    for rank, r in enumerate(rows[:top], 1):
+        ps = "  ".join(f"{k}={r[k]:.6g}" for k in swept)
+        print(f"{rank:>3} {r['pnl']:>+10.4f} {r['win_rate'] * 100:>6.1f} {r['trades_per_hour']:>9.1f} "
+              f"{r['max_drawdown']:>9.4f} {r['trades']:>6d}  {ps}")
+
+
+def _parse_kv(items: Sequence[str]) -> Dict[str, str]:
+    out = {}
+    for it in items:
+        k, _, v = it.partition("=")
+        if not v: raise SystemExit(f"expected name=value, got {it!r}")
+        out[k.strip()] = v.strip()
+    return out
+
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> None:
+    ap = argparse.ArgumentParser(prog=prog, description="Parallel StrategyConfig sweep over replayed ticks")
+    ap.add_argument("path", nargs="?", help="tick directory written by mexcbot_tickstore")
+    ap.add_argument("--synthetic", type=int, default=0, help="sweep over N synthetic ticks instead")
+    ap.add_argument("--grid", nargs="*", default=[], metavar="NAME=V1,V2,...")
+    ap.add_argument("--random", type=int, default=0, metavar="N", help="N random samples from --range")
+    ap.add_argument("--range", nargs="*", default=[], metavar="NAME=LO:HI")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=0)
+    ap.add_argument("--latency-ms", type=float, default=150.0)
+    ap.add_argument("--slippage-bps", type=float, default=1.0)
+    ap.add_argument("--fee-bps", type=float, default=0.0)
+    ap.add_argument("--top", type=int, default=20)
+    ap.add_argument("--csv", help="write every run (full config + metrics) to this file")
+    args = ap.parse_args(argv)
+
+    space: List[Dict[str, float]] = []
+    if args.grid:
+        space += grid({k: [float(x) for x in v.split(",")] for k, v in _parse_kv(args.grid).items()})
+    if args.random:
+        ranges = {k: tuple(float(x) for x in v.split(":")) for k, v in _parse_kv(args.range).items()}
+        space += random_samples(ranges, args.random, args.seed)
+    if not space:
+        ap.error("give --grid and/or --random with --range")
+
+    if not (args.path or args.synthetic):
+        ap.error("path or --synthetic is required")
+
+    swept = sorted({k for p in space for k in p})
+    # synthetic ticks live in a temp dir that is removed once the pool is done with them
+    tmp = tempfile.TemporaryDirectory(prefix="mexcbot-sweep-") if args.synthetic else contextlib.nullcontext()
+    with tmp as tmpdir:
+        path = args.path
+        if args.synthetic:
+            from mexcbot_tickstore import write_columns
+            path = os.path.join(tmpdir, "synthetic")
+            write_columns(path, rp.synthetic_ticks(args.synthetic), symbol=core.SYMBOL)
+        t0 = time.perf_counter()
+        try:
+            rows = sweep(path, space, workers=args.workers or None, latency_sec=args.latency_ms / 1e3,
+                         slippage_bps=args.slippage_bps, fee_bps=args.fee_bps)
+        except (KeyError, ValueError) as e:
+            ap.error(str(e.args[0]) if e.args else repr(e))
+        dt = time.perf_counter() - t0
+    print(f"{len(rows)} runs in {dt:.1f}s ({len(rows) / dt:.2f} runs/s, workers={args.workers or os.cpu_count()})")
+    print_table(rows, swept, args.top)
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=list(rows[0]))  # id, every StrategyConfig field, the replay summary
+            w.writeheader()
+            w.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
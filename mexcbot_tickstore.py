@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+mexcbot_tickstore.py
+Compact on-disk tick store: one fixed-width binary file per column.
+
+A tick set is a directory:
+  meta.json      symbol / schema version / column dtypes
+  exch_ts.i8     exchange time (ms, 0 when the stream has none, e.g. depth5)
+  recv_ns.i8     local receive time (ns, wall clock)
+  price.f8 qty.f8
+  side.i1        +1 taker buy / -1 taker sell / 0 = depth update
+  bid.f8 ask.f8  top of book at that moment (trade rows carry the latest book)
+
+TickRecorder appends from the WS thread into in-memory arrays and hands full
+blocks to a writer thread; TickReader memory-maps the columns as NumPy arrays
+without copying.
+"""
+from __future__ import annotations
+import json, os, queue, threading
+from array import array
+from typing import Dict, Optional
+
+try:
+    import numpy as np
+except Exception:
+    np = None  # the recorder works without NumPy; the reader and write_columns need it
+
+SCHEMA_VERSION = 1
+# name -> (array typecode, numpy dtype, file suffix)
+COLUMNS = (
+    ("exch_ts", "q", "<i8", "i8"),
+    ("recv_ns", "q", "<i8", "i8"),
+    ("price",   "d", "<f8", "f8"),
+    ("qty",     "d", "<f8", "f8"),
+    ("side",    "b", "i1",  "i1"),
+    ("bid",     "d", "<f8", "f8"),
+    ("ask",     "d", "<f8", "f8"),
+)
+SIDE_BUY, SIDE_SELL, SIDE_DEPTH = 1, -1, 0
+
+
+def _col_path(root: str, name: str, suffix: str) -> str:
+    return os.path.join(root, f"{name}.{suffix}")
+
+
+def _write_meta(path: str, symbol: str) -> None:
+    meta = {"version": SCHEMA_VERSION, "symbol": symbol,
+            "columns": {name: dt for name, _, dt, _ in COLUMNS}}
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+class TickRecorder:
+    """Buffered column writer. trade()/depth() only append to arrays; I/O runs on a background thread."""
+    def __init__(self, path: str, symbol: str = "", flush_rows: int = 8192):
+        if array("q").itemsize != 8 or array("d").itemsize != 8:
+            raise RuntimeError("unexpected array item sizes")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.flush_rows = int(flush_rows)
+        _write_meta(path, symbol)
+        self._files = [open(_col_path(path, name, sfx), "ab") for name, _, _, sfx in COLUMNS]
+        self._buf = self._new_block()
+        self._bid = 0.0; self._ask = 0.0
+        self.rows = 0
+        self._q: "queue.Queue[Optional[list]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._drain, name="tick-writer", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def _new_block() -> list:
+        return [array(code) for _, code, _, _ in COLUMNS]
+
+    def trade(self, exch_ms: int, recv_ns: int, price: float, qty: float, is_buy: bool) -> None:
+        b = self._buf
+        b[0].append(exch_ms); b[1].append(recv_ns); b[2].append(price); b[3].append(qty)
+        b[4].append(SIDE_BUY if is_buy else SIDE_SELL); b[5].append(self._bid); b[6].append(self._ask)
+        if len(b[0]) >= self.flush_rows: self._hand_off()
+
+    def depth(self, exch_ms: int, recv_ns: int, bid: float, ask: float) -> None:
+        self._bid = bid; self._ask = ask
+        b = self._buf
+        b[0].append(exch_ms); b[1].append(recv_ns); b[2].append(0.0); b[3].append(0.0)
+        b[4].append(SIDE_DEPTH); b[5].append(bid); b[6].append(ask)
+        if len(b[0]) >= self.flush_rows: self._hand_off()
+
+    def _hand_off(self) -> None:
+        block, self._buf = self._buf, self._new_block()
+        self.rows += len(block[0])
+        self._q.put(block)
+
+    def _drain(self) -> None:
+        while True:
+            block = self._q.get()
+            if block is None: return
+            for f, col in zip(self._files, block):
+                col.tofile(f)
+            for f in self._files:
+                f.flush()
+
+    def close(self) -> None:
+        if self._buf[0]: self._hand_off()
+        self._q.put(None)
+        self._writer.join()
+        for f in self._files: f.close()
+
+
+def write_columns(path: str, cols, symbol: str = "") -> None:
+    """Write whole NumPy columns (e.g. synthetic data) as a tick set in one go."""
+    if np is None:
+        raise RuntimeError("numpy is required for write_columns")
+    os.makedirs(path, exist_ok=True)
+    _write_meta(path, symbol)
+    for name, _, dt, sfx in COLUMNS:
+        np.ascontiguousarray(cols[name], dtype=dt).tofile(_col_path(path, name, sfx))
+
+
+class TickReader:
+    """Zero-copy view of a tick set: each column is a read-only np.memmap."""
+    def __init__(self, path: str):
+        if np is None:
+            raise RuntimeError("numpy is required for TickReader")
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != SCHEMA_VERSION:
+            raise ValueError(f"unsupported tick schema: {self.meta.get('version')}")
+        self.path = path
+        self.symbol = self.meta.get("symbol", "")
+        sizes = {}
+        for name, _, dt, sfx in COLUMNS:
+            sizes[name] = os.path.getsize(_col_path(path, name, sfx)) // np.dtype(dt).itemsize
+        # a crash can leave columns of different length; the common prefix is consistent
+        n = min(sizes.values())
+        self.cols: Dict[str, "np.ndarray"] = {}
+        for name, _, dt, sfx in COLUMNS:
+            if n == 0:
+                self.cols[name] = np.empty(0, dtype=dt)
+            else:
+                self.cols[name] = np.memmap(_col_path(path, name, sfx), dtype=dt, mode="r", shape=(n,))
+        self.n = n
+
+    def __len__(self) -> int: return self.n
+    def __getitem__(self, name: str) -> "np.ndarray": return self.cols[name]
+    def __getattr__(self, name: str):
+        cols = self.__dict__.get("cols")
+        if cols is not None and name in cols: return cols[name]
+        raise AttributeError(name)
+
+
+if __name__ == "__main__":
+    import sys, time
+    if len(sys.argv) != 2:
+        print("usage: python mexcbot_tickstore.py <tick-dir>"); sys.exit(2)
+    t0 = time.perf_counter(); r = TickReader(sys.argv[1]); dt = time.perf_counter() - t0
+    trades = int((r.side != SIDE_DEPTH).sum())
+    print(f"{r.path}: symbol={r.symbol} rows={len(r)} trades={trades} opened in {dt * 1e3:.2f} ms")
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+test_mexcbot_selfchecks.py
+Runs the built-in self-checks under pytest so they gate every change:
+vectorized-vs-monitor parity on synthetic ticks, the trade/aggTrade dedup fuzz and
+the WSClient resilience scenario (localhost fake server, no network).
+  python -m pytest -q test_mexcbot_selfchecks.py
+"""
+import pytest
+
+import mexcbot_sim as sim
+
+
+def test_parity_on_synthetic_ticks():
+    pytest.importorskip("numpy")
+    import mexcbot_replay as rp, mexcbot_research as research
+    st = research.check_parity(rp.synthetic_ticks(20000))
+    assert st["trades"] > 0
+
+
+@pytest.mark.parametrize("loss, seed", [(0.0, 0), (0.0, 1), (0.01, 2), (0.05, 3)])
+def test_dedup_fuzz(loss, seed):
+    st = sim.dedup_fuzz(n=20000, seed=seed, loss=loss)
+    if not loss: assert st["gaps"] == 0
+
+
+def test_resilience():
+    st = sim.resilience(log=lambda m: None)
+    assert st["gaps"] == 1 and st["gap_trades"] == 5
+    assert st["merged_late"] > 0